@@ -89,4 +89,51 @@ STATIC_ROOT = os.environ.get("DJANGO_STATIC_ROOT", str(BASE_DIR / "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.environ.get("DJANGO_MEDIA_ROOT", str(BASE_DIR / "media"))
 
-DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
\ No newline at end of file
+DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Segmentation models, keyed by the name used in the compare UI
+SEGMENTATION_MODELS = {
+    "muharaf": os.environ.get("SEGMENTATION_MUHARAF_MODEL", "muharaf_seg_best.mlmodel"),
+    "blla": os.environ.get("SEGMENTATION_BLLA_MODEL", "blla.mlmodel"),
+}
+# Maximum number of models kept loaded per worker process
+SEGMENTATION_MODEL_CACHE_SIZE = int(os.environ.get("SEGMENTATION_MODEL_CACHE_SIZE", 4))
+# Device for segmentation: "auto" (CUDA if available, else CPU), "cpu" or "cuda:N"
+SEGMENTATION_DEVICE = os.environ.get("SEGMENTATION_DEVICE", "auto")
+# torch intra-op threads per worker process for CPU inference, 0 keeps the torch default
+SEGMENTATION_CPU_THREADS = int(os.environ.get("SEGMENTATION_CPU_THREADS", 0))
+# Dynamically quantize models to int8 when running on the CPU
+SEGMENTATION_QUANTIZE = os.environ.get("SEGMENTATION_QUANTIZE", "False") == "True"
+# Running segmentation jobs started this many seconds ago are considered
+# abandoned by a dead worker and queued again, 0 never times them out
+SEGMENTATION_JOB_TIMEOUT = int(os.environ.get("SEGMENTATION_JOB_TIMEOUT", 3600))
+# Directory of cached segmentation results, empty to disable the cache
+SEGMENTATION_CACHE_DIR = os.environ.get(
+    "SEGMENTATION_CACHE_DIR", str(BASE_DIR / "segcache")
+)
+# Size limit of the segmentation cache in MB, least recently used entries are evicted
+SEGMENTATION_CACHE_MAX_MB = int(os.environ.get("SEGMENTATION_CACHE_MAX_MB", 1024))
+# Evict cached segmentations unused for this many days, 0 keeps them
+SEGMENTATION_CACHE_MAX_AGE_DAYS = int(
+    os.environ.get("SEGMENTATION_CACHE_MAX_AGE_DAYS", 90)
+)
+# Copy accepted line images into the validated folder. When False, accepted
+# lines only keep their geometry and are rendered from the page on request.
+SEGMENT_COPY_VALIDATED = os.environ.get("SEGMENT_COPY_VALIDATED", "True") == "True"
+# Directory of rendered line images, empty to keep them in memory only
+LINE_CROP_CACHE_DIR = os.environ.get("LINE_CROP_CACHE_DIR", str(BASE_DIR / "cropcache"))
+# Size limit of the rendered line image directory in MB
+LINE_CROP_CACHE_MAX_MB = int(os.environ.get("LINE_CROP_CACHE_MAX_MB", 512))
+# Size limit of rendered line images kept in memory per process in MB
+LINE_CROP_MEMORY_CACHE_MB = int(os.environ.get("LINE_CROP_MEMORY_CACHE_MB", 64))
+# Network input size relative to the model's, below 1 segments downscaled
+# pages faster but loses lines; at least 0.5, see selector.checks
+SEGMENTATION_INPUT_SCALE = float(os.environ.get("SEGMENTATION_INPUT_SCALE", 1.0))
+# Threads encoding and writing line images while the next lines are extracted
+SEGMENT_WRITER_THREADS = int(os.environ.get("SEGMENT_WRITER_THREADS", 4))
+# Threads cutting out and dewarping the lines of a page, 1 to extract serially
+SEGMENT_EXTRACT_THREADS = int(os.environ.get("SEGMENT_EXTRACT_THREADS", 4))
+# Worker processes polygonizing the lines of a page, 0 to polygonize in-process
+SEGMENT_POLYGONIZE_PROCESSES = int(os.environ.get("SEGMENT_POLYGONIZE_PROCESSES", 0))
+# Baseline vectorization stages: "exact" (kraken's), "cv2" or "fast"
+SEGMENTATION_VECTORIZER = os.environ.get("SEGMENTATION_VECTORIZER", "exact")
@@ -11,21 +11,21 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
-from .models import Document, LineSegment, Notebook
+from .models import Document, LineSegment, Notebook, SegmentationJob
 from .utils.symbol_conversion import convert_symbols
 
 
 def segment_document(modeladmin, request, queryset):
-    from kraken.lib import vgsl
+    from .jobs import enqueue
 
-    model_muharaf = vgsl.TorchVGSLModel.load_model("muharaf_seg_best.mlmodel")
-    model_blla = vgsl.TorchVGSLModel.load_model("blla.mlmodel")
+    count = 0
     for doc in queryset:
-        try:
-            extract_lines_muharaf(doc.file.path, "muharaf", model_muharaf)
-            extract_lines_blla(doc.file.path, "blla", model_blla)
-        except Exception as a:
-            pass
+        count += len(enqueue(doc, ["muharaf", "blla"]))
+    modeladmin.message_user(
+        request,
+        _("%d segmentation jobs queued.") % count,
+        level="info",
+    )
 
 
 def convert_to_unchecked(model_admin, request, queryset):
@@ -172,16 +172,25 @@ class NotebookAdmin(admin.ModelAdmin):
                             seg_dir, os.path.basename(seg.file.name)
                         )
                         shutil.copy2(seg.file.path, seg_dest_path)
-                        rel_path = os.path.relpath(seg_dest_path, output_dir)
-                        csv_rows.append(
-                            [
-                                rel_path,  # 0: line_segment_path
-                                notebook.name,  # 1: notebook_name
-                                doc.page,  # 2: page_number
-                                seg.transcription or "",  # 3: transcription
-                                seg.order,  # 4: line_segment_order (for sorting, not to be exported)
-                            ]
-                        )
+                    elif not seg.file and seg.has_geometry:
+                        from .crops import get_crop
+
+                        _, ext = os.path.splitext(doc.file.name)
+                        seg_dest_path = os.path.join(seg_dir, f"{seg.order}{ext}")
+                        with open(seg_dest_path, "wb") as fp:
+                            fp.write(get_crop(seg))
+                    else:
+                        continue
+                    rel_path = os.path.relpath(seg_dest_path, output_dir)
+                    csv_rows.append(
+                        [
+                            rel_path,  # 0: line_segment_path
+                            notebook.name,  # 1: notebook_name
+                            doc.page,  # 2: page_number
+                            seg.transcription or "",  # 3: transcription
+                            seg.order,  # 4: line_segment_order (for sorting, not to be exported)
+                        ]
+                    )
         # Sort rows by notebook_name, page_number, line_segment_order
         csv_rows.sort(key=lambda row: (str(row[1]), int(row[2]), int(row[4])))
         # Write CSV summary (exclude order from output)
@@ -675,63 +684,187 @@ class LineSegmentAdmin(admin.ModelAdmin):
         return super().response_change(request, obj)
 
     def image_tag(self, obj):
-        if obj.file:
+        if obj.file or obj.has_geometry:
             return format_html(
                 '<img src="{}" style="max-width:600px; max-height:300px;" />',
-                obj.file.url,
+                obj.image_url,
             )
         return ""
 
     image_tag.short_description = "Image"
 
 
-def extract_lines_muharaf(im_path, save_prefix: str, model, padding=10):
-    from kraken import blla
-    from PIL import Image
+def requeue_jobs(modeladmin, request, queryset):
+    from .jobs import requeue
 
-    from .segmentation import extract_polygons
+    # a job whose document and model already have a pending job is skipped
+    updated = sum(
+        requeue(job)
+        for job in queryset.exclude(status=SegmentationJob.Status.PENDING)
+    )
+    modeladmin.message_user(
+        request,
+        _("%d segmentation jobs queued again.") % updated,
+        level="info",
+    )
 
-    base_name = os.path.basename(im_path)
-    base_name_wo_ext, ext = os.path.splitext(base_name)
-    ext = ext.lstrip(".")
-    # load page image
-    im = Image.open(im_path)
 
-    # segment into lines
-    seg = blla.segment(im, text_direction="horizontal-rl", model=[model], device="cuda")
+requeue_jobs.short_description = _("صف دوباره")
 
-    # each region corresponds to a line bounding box
-    line_images = extract_polygons(im, seg, pad=padding)
-    save_segments(
-        join(settings.MEDIA_ROOT, f"{base_name_wo_ext}_muharaf"),
-        save_prefix,
-        line_images,
-        ext=ext,
+
+@admin.register(SegmentationJob)
+class SegmentationJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "document",
+        "model_name",
+        "padding",
+        "status",
+        "worker",
+        "created_at",
+        "duration",
+    ]
+    list_filter = ["status", "model_name"]
+    readonly_fields = [
+        "worker",
+        "error",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "duration",
+    ]
+    actions = [requeue_jobs]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("document__notebook")
+
+
+def extract_lines(
+    page, model_name: str, save_prefix=None, model=None, padding=10, input_scale=None
+):
+    """
+    Segments a decoded page with one model and saves the line images to
+    MEDIA_ROOT/{page}_{model_name}. Models run on the same `PageInput` share
+    its decoded image and network inputs. Unchanged pages reuse the cached
+    segmentation instead of running the model again.
+
+    `input_scale` below 1 segments a downscaled page (default
+    SEGMENTATION_INPUT_SCALE) and misses some lines; the lines found are
+    always cut from the full resolution page.
+    """
+    from .seg_cache import segment
+
+    # segment into lines
+    seg = segment(
+        page,
+        model_name,
+        text_direction="horizontal-rl",
+        model=model,
+        input_scale=input_scale,
     )
+    save_lines(page, model_name, seg, save_prefix, padding)
 
 
-def extract_lines_blla(im_path, save_prefix: str, model, padding=10):
-    from kraken import blla
-    from PIL import Image
+def reextract_lines(im_path, model_name: str, save_prefix=None, padding=10) -> bool:
+    """
+    Saves the line images of a page again with a new padding, from its cached
+    segmentation and without running the model. Returns False if the page
+    has no cached segmentation by `model_name`.
+    """
+    from .blla import PageInput
+    from .seg_cache import lookup
+
+    seg = lookup(im_path, model_name, text_direction="horizontal-rl")
+    if seg is None:
+        return False
+    save_lines(PageInput.open(im_path), model_name, seg, save_prefix, padding)
+    return True
 
+
+def save_lines(page, model_name: str, seg, save_prefix=None, padding=10):
+    """
+    Saves the line images of a segmentation and records the undilated
+    geometry of each image in the folder's manifest, see `crops`.
+    """
+    from .crops import write_manifest
     from .segmentation import extract_polygons
 
-    base_name = os.path.basename(im_path)
+    base_name = os.path.basename(page.path)
     base_name_wo_ext, ext = os.path.splitext(base_name)
     ext = ext.lstrip(".")
-    # load page image
-    im = Image.open(im_path)
-
-    # segment into lines
-    seg = blla.segment(im, text_direction="horizontal-rl", model=[model], device="cuda")
+    save_folder = join(settings.MEDIA_ROOT, f"{base_name_wo_ext}_{model_name}")
 
     # each region corresponds to a line bounding box
-    line_images = extract_polygons(im, seg, pad=padding)
-    save_segments(
-        join(settings.MEDIA_ROOT, f"{base_name_wo_ext}_blla"),
-        save_prefix,
-        line_images,
-        ext=ext,
+    line_images = extract_polygons(
+        page.im, seg, pad=padding, workers=settings.SEGMENT_EXTRACT_THREADS
+    )
+    saved = save_segments(save_folder, save_prefix or model_name, line_images, ext=ext)
+    lines = {line.id: line for line in seg.lines}
+    write_manifest(
+        save_folder,
+        {
+            "padding": padding,
+            "lines": {
+                name: {
+                    "baseline": lines[line.id].baseline,
+                    "boundary": lines[line.id].boundary,
+                }
+                for name, line in saved
+            },
+        },
+    )
+
+
+def extract_lines_multi(im_path, model_names, padding=10, input_scale=None):
+    """
+    Runs several models on one page, decoding the page image only once.
+    Yields the model name, the seconds it took and the formatted traceback
+    of its failure (empty on success) for each model in turn. A failing
+    model does not stop the others, a page that cannot be decoded fails all
+    of them.
+    """
+    import time
+    import traceback
+
+    from .blla import PageInput
+
+    start = time.perf_counter()
+    try:
+        page = PageInput.open(im_path)
+    except Exception:
+        error = traceback.format_exc()
+        for model_name in model_names:
+            yield model_name, time.perf_counter() - start, error
+        return
+    for model_name in model_names:
+        error = ""
+        try:
+            if model_name not in settings.SEGMENTATION_MODELS:
+                raise ValueError(f"Unknown segmentation model {model_name}")
+            extract_lines(page, model_name, padding=padding, input_scale=input_scale)
+        except Exception:
+            error = traceback.format_exc()
+        yield model_name, time.perf_counter() - start, error
+        start = time.perf_counter()
+
+
+def extract_lines_muharaf(
+    im_path, save_prefix: str, model=None, padding=10, input_scale=None
+):
+    from .blla import PageInput
+
+    extract_lines(
+        PageInput.open(im_path), "muharaf", save_prefix, model, padding, input_scale
+    )
+
+
+def extract_lines_blla(
+    im_path, save_prefix: str, model=None, padding=10, input_scale=None
+):
+    from .blla import PageInput
+
+    extract_lines(
+        PageInput.open(im_path), "blla", save_prefix, model, padding, input_scale
     )
 
 
@@ -752,8 +885,56 @@ def extract_lines_bbox(im_path, save_prefix: str, doc_name: str):
     save_segments(f"{doc_name}_bbox", save_prefix, line_images)
 
 
-def save_segments(save_folder: str, save_prefix: str, images, ext: str = "png"):
+def _write_image(im, save_folder: str, name: str) -> None:
+    """
+    Encodes an image into a hidden temporary file and renames it into place,
+    so readers never see a partially written line image.
+    """
+    from uuid import uuid4
+
+    from PIL import Image
+
+    ext = os.path.splitext(name)[1].lower()
+    format = Image.registered_extensions().get(ext) or im.format
+    if format is None:
+        raise ValueError(f"Cannot determine an image format for {name}")
+    tmp_path = join(save_folder, f".{name}.{uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as fp:
+            im.save(fp, format=format)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, join(save_folder, name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_segments(
+    save_folder: str, save_prefix: str, images, ext: str = "png", workers=None
+):
+    """
+    Saves line images and returns the (file name, line) pairs. Images are
+    encoded and written by a bounded pool of `workers` threads (default
+    SEGMENT_WRITER_THREADS) while the next lines are still being extracted.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
     path = Path(save_folder)
     path.mkdir(parents=True, exist_ok=True)
-    for i, output in enumerate(images):
-        output[0].save(f"{save_folder}/{save_prefix}_{i}.{ext}")
+    workers = workers or settings.SEGMENT_WRITER_THREADS
+    saved = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # bound the number of extracted images waiting to be written
+        pending = deque()
+        for i, output in enumerate(images):
+            name = f"{save_prefix}_{i}.{ext}"
+            pending.append(executor.submit(_write_image, output[0], save_folder, name))
+            saved.append((name, output[1]))
+            if len(pending) >= 2 * workers:
+                pending.popleft().result()
+        for future in pending:
+            future.result()
+    return saved
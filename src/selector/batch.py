@@ -0,0 +1,131 @@
+"""
+Multi-process batch segmentation.
+
+`segment_documents` fans documents out over a pool of worker processes. Each
+worker keeps its own model registry, so models are loaded once per worker and
+not once per document, and results are yielded as soon as each document
+finishes.
+"""
+
+import gc
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# per-worker state set up by _init_worker
+_memory_budget: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    document_id: int
+    model_name: str
+    duration: float
+    error: str = ""
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process."""
+    with open("/proc/self/statm") as fp:
+        return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _init_worker(memory_budget: Optional[int], cpu_threads: int) -> None:
+    global _memory_budget
+    import django
+
+    django.setup()
+
+    from .inference import configure_cpu, select_device
+
+    _memory_budget = memory_budget
+    if select_device() == "cpu":
+        configure_cpu(cpu_threads)
+
+
+def _segment_document(
+    document_id: int, im_path: str, model_names: list[str], padding: int
+) -> list[BatchResult]:
+    from .admin import extract_lines_multi
+    from .model_registry import clear
+
+    results = [
+        BatchResult(document_id, model_name, duration, error)
+        for model_name, duration, error in extract_lines_multi(
+            im_path, model_names, padding=padding
+        )
+    ]
+    if _memory_budget is not None and _rss_bytes() > _memory_budget:
+        logger.warning(
+            f"Worker {os.getpid()} exceeds its memory budget, dropping cached models"
+        )
+        clear()
+        gc.collect()
+    return results
+
+
+def default_workers(memory_budget: Optional[int] = None) -> int:
+    """
+    Number of worker processes: one per core, limited so that all workers
+    fit into physical memory when each uses up to `memory_budget` bytes.
+    """
+    workers = os.cpu_count() or 1
+    if memory_budget:
+        total = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        workers = min(workers, max(1, total // memory_budget))
+    return workers
+
+
+def segment_documents(
+    documents: Iterable[tuple[int, str]],
+    model_names: Iterable[str] = ("muharaf", "blla"),
+    max_workers: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    padding: int = 10,
+) -> Iterator[BatchResult]:
+    """
+    Segments documents in parallel worker processes.
+
+    Args:
+        documents: (document id, page image path) pairs.
+        model_names: Models to run on every document.
+        max_workers: Concurrency limit. Defaults to `default_workers`.
+        memory_budget: Soft limit in bytes for the resident memory of each
+                       worker. A worker above it drops its cached models after
+                       the current document.
+        padding: Line padding passed to `extract_lines`.
+
+    Yields:
+        One BatchResult per document and model, in completion order.
+    """
+    from django.conf import settings
+
+    from .inference import select_device
+
+    if max_workers is None:
+        max_workers = default_workers(memory_budget)
+    # split the cores between workers unless the thread count is configured
+    cpu_threads = settings.SEGMENTATION_CPU_THREADS or max(
+        1, (os.cpu_count() or 1) // max_workers
+    )
+    if select_device() != "cpu":
+        logger.info(f"Running {max_workers} segmentation workers sharing the GPU")
+    model_names = list(model_names)
+    # spawn so workers do not inherit CUDA state or open DB connections
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(memory_budget, cpu_threads),
+    ) as executor:
+        futures = [
+            executor.submit(_segment_document, doc_id, im_path, model_names, padding)
+            for doc_id, im_path in documents
+        ]
+        for future in as_completed(futures):
+            yield from future.result()
@@ -0,0 +1,439 @@
+#
+# Copyright 2019 Benjamin Kiessling
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+"""
+Baseline segmenter adapted from `kraken.blla`.
+
+Unlike `kraken.blla.segment`, the decoded page and the network inputs derived
+from it live in a `PageInput` that can be shared between several models run
+on the same page. Models with the same input specification reuse the resized
+grayscale image, the input tensor and the seamcarve feature map.
+Postprocessing uses the vectorization and polygonization in
+`selector.segmentation`.
+"""
+
+import logging
+import uuid
+from typing import Any, Callable, Dict, Literal, Optional, Union
+
+import numpy as np
+import shapely.geometry as geom
+import torch
+import torch.nn.functional as F
+import torchvision.transforms as tf
+from PIL import Image
+
+from kraken.containers import BaselineLine, Region, Segmentation
+from kraken.lib import dataset, vgsl
+from kraken.lib.exceptions import KrakenInvalidModelException
+from kraken.lib.util import get_im_str, is_bitonal
+
+from .checks import MIN_INPUT_SCALE
+from .segmentation import (
+    VECTORIZERS,
+    FeatureMap,
+    PolylineIndex,
+    calculate_polygonal_environment,
+    lines_in_regions,
+    neural_reading_order,
+    polygonal_reading_order,
+    scale_polygonal_lines,
+    scale_regions,
+    vectorize_lines,
+    vectorize_regions,
+)
+
+__all__ = ["PageInput", "segment"]
+
+logger = logging.getLogger(__name__)
+
+
+def _model_padding(model: vgsl.TorchVGSLModel) -> tuple[int, int, int, int]:
+    padding = model.user_metadata["hyper_params"].get("padding", (0, 0))
+    # expand padding to 4-tuple (left, right, top, bottom)
+    if isinstance(padding, int):
+        padding = (padding,) * 4
+    elif len(padding) == 2:
+        padding = (padding[0], padding[0], padding[1], padding[1])
+    return tuple(padding)
+
+
+class PageInput:
+    """
+    A decoded page image and the network inputs computed from it.
+
+    Inputs are cached by model input specification (shape and padding), so
+    models sharing a specification only resize and convert the page once.
+    """
+
+    def __init__(self, im: Image.Image, path: Optional[str] = None):
+        self.im = im
+        self.path = path
+        self._inputs: Dict[tuple, Dict[str, Any]] = {}
+
+    @classmethod
+    def open(cls, path: str) -> "PageInput":
+        """Decodes the image at `path` once."""
+        im = Image.open(path)
+        im.load()
+        return cls(im, path)
+
+    def network_input(
+        self, model: vgsl.TorchVGSLModel, input_scale: float = 1.0
+    ) -> Dict[str, Any]:
+        """
+        Returns the input tensor, the scaled grayscale image and the padding
+        for `model`. `input_scale` shrinks (or grows) the network input
+        relative to the size the model asks for.
+        """
+        batch, channels, height, width = model.input
+        if input_scale != 1.0:
+            if not height and not width:
+                height = self.im.height
+            height = max(1, round(height * input_scale)) if height else 0
+            width = max(1, round(width * input_scale)) if width else 0
+        padding = _model_padding(model)
+        key = (batch, channels, height, width, padding)
+        if key not in self._inputs:
+            transforms = dataset.ImageInputTransforms(
+                batch, height, width, channels, padding, valid_norm=False
+            )
+            tf_idx, _ = next(
+                filter(
+                    lambda x: isinstance(x[1], tf.ToTensor),
+                    enumerate(transforms.transforms),
+                )
+            )
+            res_tf = tf.Compose(transforms.transforms[:tf_idx])
+            scal_im = np.array(res_tf(self.im).convert("L"))
+            self._inputs[key] = {
+                "tensor_im": transforms(self.im),
+                "scal_im": scal_im,
+                "padding": padding,
+            }
+        return self._inputs[key]
+
+    def features(
+        self, model: vgsl.TorchVGSLModel, input_scale: float = 1.0
+    ) -> FeatureMap:
+        """
+        Returns the seamcarve energy map of the scaled input image for
+        `model`. The map is computed lazily and shared by all models with the
+        same input specification.
+        """
+        inputs = self.network_input(model, input_scale)
+        if "im_feats" not in inputs:
+            scal_im = _remove_padding(inputs["scal_im"], inputs["padding"])
+            inputs["im_feats"] = FeatureMap(scal_im)
+        return inputs["im_feats"]
+
+
+def _remove_padding(a, padding: tuple[int, int, int, int]):
+    """Crops (left, right, top, bottom) padding from the last two axes."""
+    padding = [pad if pad else None for pad in padding]
+    padding[1] = -padding[1] if padding[1] else None
+    padding[3] = -padding[3] if padding[3] else None
+    return a[..., padding[2] : padding[3], padding[0] : padding[1]]
+
+
+def compute_segmentation_map(
+    page: PageInput,
+    model: vgsl.TorchVGSLModel,
+    device: str = "cpu",
+    autocast: bool = False,
+    input_scale: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Runs the network on a page, at `input_scale` times the input size of the
+    model.
+
+    Returns:
+        A dictionary containing the heatmaps ('heatmap'), class map
+        ('cls_map'), the bounding regions for polygonization purposes
+        ('bounding_regions'), the scale between the input image and the
+        network output ('scale'), and the scaled input image to the network
+        ('scal_im').
+    """
+    im = page.im
+    if model.input[1] == 1 and model.one_channel_mode == "1" and not is_bitonal(im):
+        logger.warning(
+            "Running binary model on non-binary input image "
+            "(mode {}). This will result in severely degraded "
+            "performance".format(im.mode)
+        )
+
+    model.eval()
+    model.to(device)
+
+    inputs = page.network_input(model, input_scale)
+    tensor_im = inputs["tensor_im"]
+    scal_im = inputs["scal_im"]
+
+    with torch.autocast(device_type=device.split(":")[0], enabled=autocast):
+        with torch.no_grad():
+            logger.debug("Running network forward pass")
+            o, _ = model.nn(tensor_im.unsqueeze(0).to(device))
+
+    logger.debug("Upsampling network output")
+    o = F.interpolate(o, size=scal_im.shape)
+    # remove padding
+    o = _remove_padding(o, inputs["padding"])
+    scal_im = _remove_padding(scal_im, inputs["padding"])
+
+    o = o.squeeze().cpu().float().numpy()
+    scale = np.divide(im.size, o.shape[:0:-1])
+
+    return {
+        "heatmap": o,
+        "cls_map": model.user_metadata["class_mapping"],
+        "bounding_regions": model.user_metadata.get("bounding_regions"),
+        "scale": scale,
+        "scal_im": scal_im,
+    }
+
+
+def vec_regions(
+    heatmap: np.ndarray, cls_map: Dict, scale: float, **kwargs
+) -> Dict[str, list[Region]]:
+    """
+    Computes regions from a stack of heatmaps, a class mapping, and scaling
+    factor.
+    """
+    logger.info("Vectorizing regions")
+    regions = {}
+    for region_type, idx in cls_map["regions"].items():
+        logger.debug(f"Vectorizing regions of type {region_type}")
+        regions[region_type] = vectorize_regions(heatmap[idx])
+    for reg_type, regs in regions.items():
+        regions[reg_type] = [
+            Region(
+                id=f"_{uuid.uuid4()}",
+                boundary=x,
+                tags={"type": [{"type": reg_type}]},
+            )
+            for x in scale_regions(regs, scale)
+        ]
+    return regions
+
+
+def vec_lines(
+    heatmap: np.ndarray,
+    cls_map: Dict[str, Dict[str, int]],
+    scale: float,
+    text_direction: str = "horizontal-lr",
+    regions: list[np.ndarray] = None,
+    im_feats: Union[np.ndarray, FeatureMap] = None,
+    topline: Optional[bool] = False,
+    raise_on_error: bool = False,
+    processes: Optional[int] = None,
+    vectorizer: str = "exact",
+    **kwargs,
+) -> list[Dict[str, Any]]:
+    """
+    Computes lines from a stack of heatmaps, a class mapping, and scaling
+    factor. `processes` polygonizes the lines in worker processes, see
+    `calculate_polygonal_environment`. `vectorizer` names the baseline
+    vectorization stages in `VECTORIZERS`.
+
+    Returns:
+        A list of dictionaries containing the baselines, bounding polygons, and
+        line type.
+    """
+    if vectorizer not in VECTORIZERS:
+        raise ValueError(f'Invalid vectorizer "{vectorizer}"')
+    st_sep = cls_map["aux"]["_start_separator"]
+    end_sep = cls_map["aux"]["_end_separator"]
+
+    logger.info("Vectorizing baselines")
+    baselines = []
+    for bl_type, idx in cls_map["baselines"].items():
+        logger.debug(f"Vectorizing lines of type {bl_type}")
+        baselines.extend(
+            [
+                (bl_type, x)
+                for x in vectorize_lines(
+                    heatmap[(st_sep, end_sep, idx), :, :],
+                    text_direction=text_direction[:-3],
+                    **VECTORIZERS[vectorizer],
+                )
+            ]
+        )
+    logger.debug("Polygonizing lines")
+
+    in_regions = lines_in_regions(
+        [x[1] for x in baselines], [geom.Polygon(x) for x in regions]
+    )
+    # other baselines and the containing regions bound each line, indexed once
+    obstacles = PolylineIndex([x[1] for x in baselines] + list(regions))
+    line_obstacles = []
+    for bl_idx in range(len(baselines)):
+        suppl_idx = [idx for idx in range(len(baselines)) if idx != bl_idx]
+        suppl_idx.extend(len(baselines) + np.flatnonzero(in_regions[bl_idx]))
+        line_obstacles.append(obstacles.select(suppl_idx))
+    pols = calculate_polygonal_environment(
+        baselines=[bl[1] for bl in baselines],
+        im_feats=im_feats,
+        topline=topline,
+        raise_on_error=raise_on_error,
+        obstacles=line_obstacles,
+        processes=processes,
+    )
+    lines = [(bl[0], bl[1], pol) for bl, pol in zip(baselines, pols) if pol is not None]
+
+    logger.debug("Scaling vectorized lines")
+    sc = scale_polygonal_lines([x[1:] for x in lines], scale)
+
+    lines = list(zip([x[0] for x in lines], [x[0] for x in sc], [x[1] for x in sc]))
+    return [
+        {"tags": {"type": [{"type": bl_type}]}, "baseline": bl, "boundary": pl}
+        for bl_type, bl, pl in lines
+    ]
+
+
+def segment(
+    page: PageInput,
+    model: vgsl.TorchVGSLModel,
+    text_direction: Literal[
+        "horizontal-lr", "horizontal-rl", "vertical-lr", "vertical-rl"
+    ] = "horizontal-lr",
+    reading_order_fn: Callable = polygonal_reading_order,
+    device: str = "cpu",
+    raise_on_error: bool = False,
+    autocast: bool = False,
+    input_scale: float = 1.0,
+    polygonize_processes: Optional[int] = None,
+    vectorizer: str = "exact",
+) -> Segmentation:
+    """
+    Segments a page into text lines using a single baseline segmentation
+    model. Equivalent to `kraken.blla.segment` with one model and no mask.
+
+    Args:
+        page: Decoded page, possibly shared with other models.
+        model: A TorchVGSLModel containing a segmentation model.
+        text_direction: Principal text direction for reading order and
+                        fallback line orientation.
+        reading_order_fn: Function to determine the reading order.
+        device: The target device to run the neural network on.
+        raise_on_error: Raises error instead of logging them when they are
+                        not-blocking
+        autocast: Runs the model with automatic mixed precision
+        input_scale: Factor applied to the network input size. Values below
+                     1 segment a downscaled page faster but miss some lines
+                     entirely; the lines found are still returned in full
+                     resolution page coordinates. Must be at least
+                     `MIN_INPUT_SCALE`.
+        polygonize_processes: Number of worker processes polygonizing the
+                              lines. None or 1 polygonizes in this process.
+        vectorizer: Baseline vectorization stages, a key of `VECTORIZERS`.
+                    `exact` reproduces kraken.
+
+    Returns:
+        A :class:`kraken.containers.Segmentation` with reading order sorted
+        baselines and their polygonal boundaries.
+    """
+    if model.model_type != "segmentation":
+        raise KrakenInvalidModelException(
+            f"Invalid model type {model.model_type} for {model}"
+        )
+    if "class_mapping" not in model.user_metadata:
+        raise KrakenInvalidModelException(
+            f"Segmentation model {model} does not contain valid class mapping"
+        )
+    if input_scale < MIN_INPUT_SCALE:
+        raise ValueError(
+            f"Input scale {input_scale} is below the lowest tested scale {MIN_INPUT_SCALE}"
+        )
+
+    im = page.im
+    logger.info(f"Segmenting {get_im_str(im)}")
+
+    topline = model.user_metadata.get("topline", False)
+    rets = compute_segmentation_map(
+        page, model, device, autocast=autocast, input_scale=input_scale
+    )
+    regions = vec_regions(**rets)
+
+    # flatten regions for line ordering/fetch bounding regions
+    line_regs = []
+    for cls, regs in regions.items():
+        line_regs.extend(regs)
+    # convert back to net scale
+    line_regs = scale_regions([x.boundary for x in line_regs], 1 / rets["scale"])
+
+    lines = vec_lines(
+        **rets,
+        regions=line_regs,
+        im_feats=page.features(model, input_scale),
+        text_direction=text_direction,
+        topline=topline,
+        raise_on_error=raise_on_error,
+        processes=polygonize_processes,
+        vectorizer=vectorizer,
+    )
+
+    if "ro_model" in model.aux_layers:
+        logger.info(f"Using reading order model found in segmentation model {model}.")
+        order = neural_reading_order(
+            lines=lines,
+            regions=regions,
+            text_direction=text_direction[-2:],
+            model=model.aux_layers["ro_model"],
+            im_size=im.size,
+            class_mapping=model.user_metadata["ro_class_mapping"],
+        )
+    else:
+        order = None
+
+    script_detection = len(rets["cls_map"]["baselines"]) > 1
+
+    # create objects and assign IDs
+    blls = []
+    _shp_regs = {}
+    for reg_type, rgs in regions.items():
+        for reg in rgs:
+            _shp_regs[reg.id] = geom.Polygon(reg.boundary)
+
+    # reorder lines
+    logger.debug(f"Reordering baselines with main RO function {reading_order_fn}.")
+    basic_lo = reading_order_fn(
+        lines=lines, regions=_shp_regs.values(), text_direction=text_direction[-2:]
+    )
+    lines = [lines[idx] for idx in basic_lo]
+
+    reg_ids = list(_shp_regs)
+    in_regions = lines_in_regions(
+        [line["baseline"] for line in lines], _shp_regs.values()
+    )
+    for line, line_in_regions in zip(lines, in_regions):
+        line_regs = [reg_ids[idx] for idx in np.flatnonzero(line_in_regions)]
+        blls.append(
+            BaselineLine(
+                id=f"_{uuid.uuid4()}",
+                baseline=line["baseline"],
+                boundary=line["boundary"],
+                tags=line["tags"],
+                regions=line_regs,
+            )
+        )
+
+    return Segmentation(
+        text_direction=text_direction,
+        imagename=getattr(im, "filename", None),
+        type="baselines",
+        lines=blls,
+        regions=regions,
+        script_detection=script_detection,
+        line_orders=[order] if order is not None else [],
+    )
@@ -0,0 +1,34 @@
+"""
+System checks of the segmentation settings.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# lowest network input scale that was measured with `benchmark scale`, a
+# 2448x3444 page kept only 35 of its 58 lines there
+MIN_INPUT_SCALE = 0.5
+
+
+@register()
+def check_input_scale(app_configs, **kwargs):
+    scale = settings.SEGMENTATION_INPUT_SCALE
+    if scale < MIN_INPUT_SCALE:
+        return [
+            Error(
+                f"SEGMENTATION_INPUT_SCALE {scale} is below the lowest tested "
+                f"scale {MIN_INPUT_SCALE}.",
+                hint="Use a value between 0.5 and 1.",
+                id="selector.E001",
+            )
+        ]
+    if scale < 1.0:
+        return [
+            Warning(
+                f"SEGMENTATION_INPUT_SCALE {scale} loses lines: segmentation "
+                "below 1.0 misses some lines entirely, not only boundary detail.",
+                hint="Compare with `manage.py benchmark scale` on your pages.",
+                id="selector.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,212 @@
+"""
+Line images rendered on demand from the page image and the line geometry.
+
+Line folders keep the undilated polygon and baseline of each saved line in a
+`.lines.json` manifest, and accepted lines carry them into `LineSegment`. A
+line segment without a file is rendered from its page with the same dilation
+and dewarping as `extract_polygons`, so the result matches the saved crop.
+
+Rendered crops are kept in a bounded in-memory LRU and in an on-disk LRU
+under `LINE_CROP_CACHE_DIR`. The last few decoded pages are kept as well, as
+the lines of a page are usually requested one after another.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from .blla import PageInput
+    from .models import LineSegment
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".lines.json"
+# decoded pages kept for rendering
+PAGE_CACHE_SIZE = 2
+# prune the disk cache after this many new entries
+PRUNE_INTERVAL = 100
+
+_lock = threading.Lock()
+_crops: "OrderedDict[str, bytes]" = OrderedDict()
+_crops_bytes = 0
+_pages: "OrderedDict[tuple[str, float], PageInput]" = OrderedDict()
+_writes = 0
+
+
+def read_manifest(folder: str) -> dict:
+    """Returns the geometry manifest of a line folder, empty if missing."""
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME), encoding="utf-8") as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(folder: str, manifest: dict) -> None:
+    from uuid import uuid4
+
+    # a plain open keeps the umask mode, the manifest is read by other users
+    tmp_path = os.path.join(folder, f"{MANIFEST_NAME}.{uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(manifest, fp, default=lambda o: o.tolist())
+        os.replace(tmp_path, os.path.join(folder, MANIFEST_NAME))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _ext(segment: "LineSegment") -> str:
+    return os.path.splitext(segment.document.file.name)[1].lstrip(".").lower()
+
+
+def content_type(segment: "LineSegment") -> str:
+    from PIL import Image
+
+    return Image.MIME.get(
+        Image.registered_extensions()[f".{_ext(segment)}"], "application/octet-stream"
+    )
+
+
+def crop_key(segment: "LineSegment") -> str:
+    page_path = segment.document.file.path
+    return hashlib.sha256(
+        json.dumps(
+            [
+                page_path,
+                os.path.getmtime(page_path),
+                segment.polygon,
+                segment.baseline,
+                segment.padding or 0,
+            ]
+        ).encode()
+    ).hexdigest()
+
+
+def _page(path: str) -> "PageInput":
+    from .blla import PageInput
+
+    key = (path, os.path.getmtime(path))
+    with _lock:
+        if key in _pages:
+            _pages.move_to_end(key)
+            return _pages[key]
+    page = PageInput.open(path)
+    with _lock:
+        _pages[key] = page
+        while len(_pages) > PAGE_CACHE_SIZE:
+            _pages.popitem(last=False)
+    return page
+
+
+def render(segment: "LineSegment") -> bytes:
+    """Renders the line image of a segment with stored geometry."""
+    from kraken.containers import BaselineLine, Segmentation
+    from PIL import Image
+
+    from .segmentation import extract_polygons
+
+    page = _page(segment.document.file.path)
+    seg = Segmentation(
+        type="baselines",
+        imagename=page.path,
+        text_direction="horizontal-rl",
+        script_detection=False,
+        lines=[
+            BaselineLine(
+                id=str(segment.pk), baseline=segment.baseline, boundary=segment.polygon
+            )
+        ],
+    )
+    images = list(extract_polygons(page.im, seg, pad=segment.padding or 0))
+    if not images:
+        raise ValueError(f"Line segment {segment.pk} is too short to render")
+    buf = io.BytesIO()
+    images[0][0].save(buf, format=Image.registered_extensions()[f".{_ext(segment)}"])
+    return buf.getvalue()
+
+
+def _disk_path(key: str, ext: str) -> str:
+    return os.path.join(settings.LINE_CROP_CACHE_DIR, key[:2], f"{key}.{ext}")
+
+
+def _remember(key: str, data: bytes) -> None:
+    global _crops_bytes
+    limit = settings.LINE_CROP_MEMORY_CACHE_MB * 1024 * 1024
+    with _lock:
+        if key in _crops or len(data) > limit:
+            return
+        _crops[key] = data
+        _crops_bytes += len(data)
+        while _crops_bytes > limit:
+            _, old = _crops.popitem(last=False)
+            _crops_bytes -= len(old)
+
+
+def _store(path: str, data: bytes) -> None:
+    global _writes
+    from .seg_cache import prune
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    with _lock:
+        _writes += 1
+        due = _writes % PRUNE_INTERVAL == 0
+    if due:
+        prune(
+            settings.LINE_CROP_CACHE_MAX_MB * 1024 * 1024,
+            max_age=0,
+            root=settings.LINE_CROP_CACHE_DIR,
+            suffix=os.path.splitext(path)[1],
+        )
+
+
+def get_crop(segment: "LineSegment") -> bytes:
+    """
+    Returns the encoded line image of a segment with stored geometry, from
+    the memory or disk cache when possible.
+    """
+    key = crop_key(segment)
+    with _lock:
+        data: Optional[bytes] = _crops.get(key)
+        if data is not None:
+            _crops.move_to_end(key)
+            return data
+    path = _disk_path(key, _ext(segment)) if settings.LINE_CROP_CACHE_DIR else None
+    if path:
+        # a concurrent prune may evict the file at any point
+        try:
+            with open(path, "rb") as fp:
+                data = fp.read()
+            # mark as recently used for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    if data is None:
+        data = render(segment)
+        if path:
+            # the disk cache is best effort, serve the render regardless
+            try:
+                _store(path, data)
+            except OSError as e:
+                logger.warning(f"Could not cache line image {path}: {e}")
+    _remember(key, data)
+    return data
@@ -0,0 +1,102 @@
+"""
+Device selection and timing around the neural segmentation step.
+
+`segment_page` picks CUDA when it is available and otherwise runs on the CPU
+with a fixed intra-op thread count, optionally on a dynamically int8
+quantized copy of the model.
+"""
+
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from kraken.containers import Segmentation
+    from kraken.lib.vgsl import TorchVGSLModel
+
+    from .blla import PageInput
+
+logger = logging.getLogger(__name__)
+
+_cpu_configured = False
+
+
+def select_device() -> str:
+    """
+    Returns the torch device to run segmentation on. `SEGMENTATION_DEVICE`
+    may name a device explicitly; "auto" prefers CUDA and falls back to CPU.
+    """
+    import torch
+
+    device = settings.SEGMENTATION_DEVICE
+    if device != "auto":
+        return device
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def configure_cpu(threads: int = 0) -> None:
+    """
+    Sets the torch intra-op thread count for this process once. `threads`
+    overrides `SEGMENTATION_CPU_THREADS`; 0 for both keeps the torch default.
+    """
+    global _cpu_configured
+    import torch
+
+    if _cpu_configured:
+        return
+    threads = threads or settings.SEGMENTATION_CPU_THREADS
+    if threads > 0:
+        torch.set_num_threads(threads)
+    logger.info(f"CPU segmentation using {torch.get_num_threads()} threads")
+    _cpu_configured = True
+
+
+def quantize_model(model: "TorchVGSLModel") -> "TorchVGSLModel":
+    """
+    Replaces the linear and recurrent layers of a VGSL model with dynamically
+    int8 quantized versions in place. Only useful for CPU inference.
+    """
+    import torch
+
+    model.nn = torch.ao.quantization.quantize_dynamic(
+        model.nn, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8
+    )
+    return model
+
+
+def segment_page(
+    page: "PageInput",
+    model: "TorchVGSLModel",
+    text_direction: str = "horizontal-rl",
+    input_scale: float = 1.0,
+) -> "Segmentation":
+    """
+    Runs `blla.segment` on the selected device and logs the per-page latency.
+    `input_scale` below 1 segments a downscaled page, see `blla.segment`.
+    """
+    import torch
+
+    from . import blla
+
+    device = select_device()
+    if device == "cpu":
+        configure_cpu()
+    start = time.perf_counter()
+    with torch.inference_mode():
+        seg = blla.segment(
+            page,
+            model,
+            text_direction=text_direction,
+            device=device,
+            input_scale=input_scale,
+            polygonize_processes=settings.SEGMENT_POLYGONIZE_PROCESSES,
+            vectorizer=settings.SEGMENTATION_VECTORIZER,
+        )
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Segmented {page.path or 'page'} on {device} "
+        f"at scale {input_scale} into {len(seg.lines)} lines in {elapsed:.2f}s"
+    )
+    return seg
@@ -0,0 +1,218 @@
+"""
+Database-backed queue for segmentation jobs.
+
+The admin action and the compare page only enqueue jobs; the
+`segmentation_worker` management command claims and runs them. Claims use
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of workers can share the
+queue.
+"""
+
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Document, SegmentationJob
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(
+    document: Document, model_names: Iterable[str], padding: int = 10
+) -> list[SegmentationJob]:
+    """
+    Queues one job per model for `document`. A job that is still pending for
+    the same document and model is reused with the new padding instead of
+    queueing a duplicate. A unique constraint on pending jobs keeps
+    concurrent callers from queueing duplicates.
+    """
+    jobs = []
+    for model_name in model_names:
+        job, created = SegmentationJob.objects.get_or_create(
+            document=document,
+            model_name=model_name,
+            status=SegmentationJob.Status.PENDING,
+            defaults={"padding": padding},
+        )
+        if not created and job.padding != padding:
+            job.padding = padding
+            SegmentationJob.objects.filter(
+                pk=job.pk, status=SegmentationJob.Status.PENDING
+            ).update(padding=padding)
+        jobs.append(job)
+    return jobs
+
+
+def _unchanged(job: SegmentationJob):
+    # the job's row, as long as nobody claimed, finished or requeued it since
+    return SegmentationJob.objects.filter(
+        pk=job.pk, status=job.status, worker=job.worker, started_at=job.started_at
+    )
+
+
+def requeue(job: SegmentationJob) -> bool:
+    """
+    Queues a job again. Returns False and leaves the job alone if it changed
+    since it was read, or if another job for the same document and model is
+    already pending.
+    """
+    try:
+        with transaction.atomic():
+            updated = _unchanged(job).update(
+                status=SegmentationJob.Status.PENDING,
+                worker="",
+                error="",
+                started_at=None,
+                finished_at=None,
+                duration=None,
+            )
+    except IntegrityError:
+        return False
+    return bool(updated)
+
+
+def _release(stale: Iterable[SegmentationJob], reason: str) -> int:
+    # jobs superseded by a newer pending job are failed instead
+    requeued = 0
+    for job in stale:
+        if requeue(job):
+            requeued += 1
+            logger.warning(f"Segmentation job {job.pk} ({job}) queued again: {reason}")
+        elif _unchanged(job).update(
+            status=SegmentationJob.Status.FAILED,
+            error=reason,
+            finished_at=timezone.now(),
+        ):
+            logger.warning(f"Segmentation job {job.pk} ({job}) failed: {reason}")
+    return requeued
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def requeue_orphaned(worker: Optional[str] = None) -> int:
+    """
+    Queues running jobs of dead workers on this host again. Meant to be
+    called by `worker` when it starts and holds no jobs, so a job carrying
+    its own name was left behind by an earlier process, e.g. in a restarted
+    container. Returns the number of requeued jobs.
+    """
+    worker = worker or worker_name()
+    host = socket.gethostname()
+    orphaned = []
+    for job in SegmentationJob.objects.filter(
+        status=SegmentationJob.Status.RUNNING, worker__startswith=f"{host}:"
+    ):
+        pid = job.worker.rpartition(":")[2]
+        if job.worker == worker or not pid.isdigit() or not _process_exists(int(pid)):
+            orphaned.append(job)
+    return _release(orphaned, "worker process is gone")
+
+
+def requeue_stale(timeout: Optional[int] = None) -> int:
+    """
+    Queues running jobs started more than `timeout` seconds ago again, their
+    worker is assumed to have died. `timeout` defaults to
+    `SEGMENTATION_JOB_TIMEOUT`, 0 disables the check. Returns the number of
+    requeued jobs.
+    """
+    from django.conf import settings
+
+    if timeout is None:
+        timeout = settings.SEGMENTATION_JOB_TIMEOUT
+    if not timeout:
+        return 0
+    stale = SegmentationJob.objects.filter(
+        status=SegmentationJob.Status.RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    return _release(list(stale), f"not finished within {timeout}s")
+
+
+def claim_next(worker: Optional[str] = None) -> list[SegmentationJob]:
+    """
+    Atomically marks the oldest pending job as running and returns it, along
+    with the other pending jobs for the same document and padding so that
+    they can share one decode of the page. Returns an empty list if the queue
+    is empty. Rows locked by other workers are skipped. Timed out running
+    jobs are queued again first, see `requeue_stale`.
+    """
+    requeue_stale()
+    with transaction.atomic():
+        pending = SegmentationJob.objects.select_for_update(skip_locked=True).filter(
+            status=SegmentationJob.Status.PENDING
+        )
+        first = pending.order_by("created_at", "pk").first()
+        if first is None:
+            return []
+        jobs = list(
+            pending.filter(
+                document_id=first.document_id, padding=first.padding
+            ).order_by("created_at", "pk")
+        )
+        worker = worker or worker_name()
+        started_at = timezone.now()
+        SegmentationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=SegmentationJob.Status.RUNNING, worker=worker, started_at=started_at
+        )
+        for job in jobs:
+            job.status = SegmentationJob.Status.RUNNING
+            job.worker = worker
+            job.started_at = started_at
+    return jobs
+
+
+def _finish(job: SegmentationJob, duration: float, error: str = "") -> None:
+    job.status = (
+        SegmentationJob.Status.FAILED if error else SegmentationJob.Status.DONE
+    )
+    job.error = error
+    job.duration = duration
+    job.finished_at = timezone.now()
+    # a job requeued by requeue_stale meanwhile belongs to another worker now
+    SegmentationJob.objects.filter(
+        pk=job.pk, status=SegmentationJob.Status.RUNNING, worker=job.worker
+    ).update(
+        status=job.status,
+        error=job.error,
+        duration=job.duration,
+        finished_at=job.finished_at,
+    )
+    logger.info(
+        f"Segmentation job {job.pk} ({job}) {job.get_status_display()} "
+        f"in {job.duration:.2f}s"
+    )
+
+
+def run(jobs: list[SegmentationJob]) -> list[SegmentationJob]:
+    """
+    Runs claimed jobs for one document and records the outcome, timing and
+    any error of each. The page image is decoded once for all of them.
+    """
+    from .admin import extract_lines_multi
+
+    results = extract_lines_multi(
+        jobs[0].document.file.path,
+        [job.model_name for job in jobs],
+        padding=jobs[0].padding,
+    )
+    for job, (_, duration, error) in zip(jobs, results):
+        if error:
+            logger.error(f"Segmentation job {job.pk} ({job}) failed\n{error}")
+        _finish(job, duration, error)
+    return jobs
@@ -0,0 +1,224 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from selector.blla import PageInput
+from selector.models import Document
+
+
+class Command(BaseCommand):
+    help = "Benchmarks parts of the segmentation pipeline."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        scale = subparsers.add_parser(
+            "scale",
+            help="Segmentation speed and agreement with full scale per input scale.",
+        )
+        scale.add_argument("--document", type=int, help="Document id.")
+        scale.add_argument("--image", help="Page image path.")
+        scale.add_argument("--model", default="blla", help="Segmentation model.")
+        scale.add_argument(
+            "--scales",
+            default="1,0.75,0.5,0.35",
+            help="Comma-separated input scales; 1 is the reference.",
+        )
+
+        seam = subparsers.add_parser(
+            "seam", help="Seam carving of the polygonizer against the original loop."
+        )
+        seam.add_argument(
+            "--widths",
+            default="50,100,200,300,400,500,600",
+            help="Comma-separated patch widths.",
+        )
+        seam.add_argument("--height", type=int, default=120, help="Patch height.")
+        seam.add_argument("--repeat", type=int, default=20)
+
+        vectorize = subparsers.add_parser(
+            "vectorize",
+            help="Baseline vectorization stages against kraken's on the same heatmaps.",
+        )
+        vectorize.add_argument("--document", type=int, help="Document id.")
+        vectorize.add_argument("--image", help="Page image path.")
+        vectorize.add_argument("--model", default="blla", help="Segmentation model.")
+        vectorize.add_argument(
+            "--vectorizer", default="fast", help="Name in VECTORIZERS to compare."
+        )
+        vectorize.add_argument("--ridge-filter", choices=("skimage", "cv2"))
+        vectorize.add_argument("--ridge-downsample", type=int)
+        vectorize.add_argument("--thinning", choices=("skimage", "cv2"))
+        vectorize.add_argument("--pairing", choices=("mcp", "components"))
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(**options)
+
+    def _page_path(self, options) -> str:
+        if options["image"]:
+            return options["image"]
+        if options["document"]:
+            return Document.objects.get(pk=options["document"]).file.path
+        raise CommandError("Give --document or --image.")
+
+    def handle_scale(self, **options):
+        import numpy as np
+        import shapely.geometry as geom
+
+        from selector.inference import segment_page
+        from selector.model_registry import get_model
+
+        path = self._page_path(options)
+        model = get_model(options["model"])
+        scales = [float(x) for x in options["scales"].split(",")]
+        if 1.0 not in scales:
+            scales.insert(0, 1.0)
+
+        results = {}
+        for scale in scales:
+            # fresh page so no scale reuses the inputs of another
+            page = PageInput.open(path)
+            start = time.perf_counter()
+            seg = segment_page(page, model, input_scale=scale)
+            results[scale] = (time.perf_counter() - start, seg.lines)
+
+        ref_time, ref_lines = results[1.0]
+        ref_polys = [geom.Polygon(line.boundary).buffer(0) for line in ref_lines]
+        self.stdout.write(
+            f"{'scale':>6} {'time':>8} {'speedup':>8} {'lines':>6} "
+            f"{'matched':>8} {'IoU':>6} {'baseline px':>12}"
+        )
+        for scale in scales:
+            elapsed, lines = results[scale]
+            polys = [geom.Polygon(line.boundary).buffer(0) for line in lines]
+            ious, dists = [], []
+            for ref_line, ref_poly in zip(ref_lines, ref_polys):
+                best, best_idx = 0.0, None
+                for idx, poly in enumerate(polys):
+                    if not ref_poly.intersects(poly):
+                        continue
+                    iou = ref_poly.intersection(poly).area / ref_poly.union(poly).area
+                    if iou > best:
+                        best, best_idx = iou, idx
+                if best >= 0.5:
+                    ious.append(best)
+                    dists.append(
+                        geom.LineString(ref_line.baseline).hausdorff_distance(
+                            geom.LineString(lines[best_idx].baseline)
+                        )
+                    )
+            self.stdout.write(
+                f"{scale:>6.2f} {elapsed:>7.2f}s {ref_time / elapsed:>7.2f}x "
+                f"{len(lines):>6} {len(ious):>4}/{len(ref_lines):<3} "
+                f"{np.mean(ious) if ious else 0:>6.3f} "
+                f"{np.mean(dists) if dists else 0:>12.1f}"
+            )
+
+    def handle_seam(self, **options):
+        import numpy as np
+
+        from selector.segmentation import _carve_seam
+
+        rng = np.random.default_rng(0)
+        self.stdout.write(
+            f"{'width':>6} {'original':>10} {'current':>10} {'speedup':>8} {'identical':>10}"
+        )
+        for width in [int(x) for x in options["widths"].split(",")]:
+            # quantized energies with masked areas, so ties and large
+            # constant regions occur as in real patches
+            energy = np.round(rng.random((options["height"], width)) * 20) / 4
+            energy[: options["height"] // 5] = 99999
+            energy[:, : width // 10] = 99999
+            energy = np.pad(
+                energy, ((1, 1), (0, 0)), mode="constant", constant_values=np.inf
+            )
+            timings = []
+            for fn in (_carve_seam_loop, _carve_seam):
+                start = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    rows = fn(energy.copy())
+                timings.append(((time.perf_counter() - start) / options["repeat"], rows))
+            (t_orig, ref), (t_new, rows) = timings
+            self.stdout.write(
+                f"{width:>6} {t_orig * 1000:>8.2f}ms {t_new * 1000:>8.2f}ms "
+                f"{t_orig / t_new:>7.1f}x {str(np.array_equal(ref, rows)):>10}"
+            )
+
+    def handle_vectorize(self, **options):
+        import numpy as np
+        import shapely.geometry as geom
+        import torch
+
+        from selector.blla import compute_segmentation_map
+        from selector.model_registry import get_model
+        from selector.segmentation import VECTORIZERS, vectorize_lines
+
+        if options["vectorizer"] not in VECTORIZERS:
+            raise CommandError(f"Unknown vectorizer {options['vectorizer']}.")
+        stages = dict(VECTORIZERS[options["vectorizer"]])
+        for stage in ("ridge_filter", "ridge_downsample", "thinning", "pairing"):
+            if options[stage] is not None:
+                stages[stage] = options[stage]
+
+        # the network runs once, both vectorizers see the same heatmaps
+        with torch.inference_mode():
+            rets = compute_segmentation_map(
+                PageInput.open(self._page_path(options)), get_model(options["model"])
+            )
+        aux = rets["cls_map"]["aux"]
+        self.stdout.write(f"Stages: {stages}")
+        self.stdout.write(
+            f"{'type':>12} {'exact':>8} {'current':>8} {'speedup':>8} "
+            f"{'lines':>9} {'matched':>8} {'hausdorff px':>13}"
+        )
+        for bl_type, idx in rets["cls_map"]["baselines"].items():
+            heatmap = rets["heatmap"][
+                (aux["_start_separator"], aux["_end_separator"], idx), :, :
+            ]
+            timings = []
+            for kwargs in ({}, stages):
+                start = time.perf_counter()
+                lines = vectorize_lines(heatmap, text_direction="horizontal", **kwargs)
+                timings.append((time.perf_counter() - start, lines))
+            (t_ref, ref_lines), (t_new, lines) = timings
+            strings = [geom.LineString(line) for line in lines if len(line) > 1]
+            # nearest line of the compared stages for each of kraken's
+            dists = [
+                min(geom.LineString(ref).hausdorff_distance(s) for s in strings)
+                for ref in ref_lines
+                if len(ref) > 1 and strings
+            ]
+            matched = [d for d in dists if d < 20]
+            self.stdout.write(
+                f"{bl_type:>12} {t_ref:>7.2f}s {t_new:>7.2f}s {t_ref / t_new:>7.1f}x "
+                f"{len(lines):>4}/{len(ref_lines):<4} {len(matched):>8} "
+                f"{np.mean(matched) if matched else 0:>13.2f}"
+            )
+
+
+def _carve_seam_loop(rotated_patch):
+    """The original column-by-column seam carving of `_calc_seam`."""
+    import numpy as np
+
+    r, c = rotated_patch.shape
+    # fold into shape (c, r-2 3)
+    A = np.lib.stride_tricks.as_strided(
+        rotated_patch,
+        (c, r - 2, 3),
+        (rotated_patch.strides[1], rotated_patch.strides[0], rotated_patch.strides[0]),
+    )
+    B = rotated_patch[1:-1, 1:].swapaxes(0, 1)
+    backtrack = np.zeros_like(B, dtype="int")
+    T = np.empty((B.shape[1]), "f")
+    R = np.arange(-1, len(T) - 1)
+    for i in np.arange(c - 1):
+        A[i].min(1, T)
+        backtrack[i] = A[i].argmin(1) + R
+        B[i] += T
+    # backtrack
+    seam = []
+    j = np.argmin(rotated_patch[1:-1, -1])
+    for i in range(c - 2, -2, -1):
+        seam.append(j)
+        j = backtrack[i, j]
+    return np.array(seam)[::-1]
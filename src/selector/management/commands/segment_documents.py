@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from selector.batch import segment_documents
+from selector.models import Document
+
+
+class Command(BaseCommand):
+    help = "Segments documents in parallel worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="Document ids.")
+        parser.add_argument(
+            "--notebook", help="Segment all documents of the notebook with this name."
+        )
+        parser.add_argument(
+            "--models",
+            default="muharaf,blla",
+            help="Comma-separated segmentation models to run on every document.",
+        )
+        parser.add_argument(
+            "--workers", type=int, help="Number of worker processes (default: one per core)."
+        )
+        parser.add_argument(
+            "--memory-budget",
+            type=int,
+            help="Resident memory budget per worker in MB.",
+        )
+        parser.add_argument("--padding", type=int, default=10)
+
+    def handle(self, *args, **options):
+        documents = Document.objects.exclude(file="")
+        if options["notebook"]:
+            documents = documents.filter(notebook__name=options["notebook"])
+        elif options["ids"]:
+            documents = documents.filter(pk__in=options["ids"])
+        else:
+            raise CommandError("Give document ids or --notebook.")
+        documents = [(doc.pk, doc.file.path) for doc in documents.order_by("page")]
+        memory_budget = options["memory_budget"]
+        if memory_budget:
+            memory_budget *= 1024 * 1024
+
+        total = len(documents) * len(options["models"].split(","))
+        failed = 0
+        for done, result in enumerate(
+            segment_documents(
+                documents,
+                model_names=options["models"].split(","),
+                max_workers=options["workers"],
+                memory_budget=memory_budget,
+                padding=options["padding"],
+            ),
+            start=1,
+        ):
+            if result.error:
+                failed += 1
+                self.stderr.write(
+                    f"[{done}/{total}] document {result.document_id} {result.model_name} failed:\n{result.error}"
+                )
+            else:
+                self.stdout.write(
+                    f"[{done}/{total}] document {result.document_id} {result.model_name} in {result.duration:.2f}s"
+                )
+        self.stdout.write(f"Done: {total - failed} succeeded, {failed} failed.")
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from selector import seg_cache
+from selector.blla import PageInput
+from selector.models import Document
+
+
+class Command(BaseCommand):
+    help = "Manages the on-disk cache of segmentation results."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        warm = subparsers.add_parser(
+            "warm", help="Segment documents into the cache without saving lines."
+        )
+        warm.add_argument("ids", nargs="*", type=int, help="Document ids.")
+        warm.add_argument(
+            "--notebook", help="Warm all documents of the notebook with this name."
+        )
+        warm.add_argument(
+            "--models",
+            default="muharaf,blla",
+            help="Comma-separated segmentation models.",
+        )
+
+        prune = subparsers.add_parser(
+            "prune", help="Evict least recently used entries."
+        )
+        prune.add_argument(
+            "--max-mb",
+            type=int,
+            help="Size limit in MB (default: SEGMENTATION_CACHE_MAX_MB).",
+        )
+        prune.add_argument(
+            "--max-age-days",
+            type=float,
+            help="Evict entries unused for this many days "
+            "(default: SEGMENTATION_CACHE_MAX_AGE_DAYS).",
+        )
+
+        subparsers.add_parser("stats", help="Show the number and size of entries.")
+
+    def handle(self, *args, **options):
+        if not seg_cache.enabled():
+            raise CommandError("SEGMENTATION_CACHE_DIR is not set.")
+        getattr(self, f"handle_{options['action']}")(**options)
+
+    def handle_warm(self, **options):
+        documents = Document.objects.exclude(file="")
+        if options["notebook"]:
+            documents = documents.filter(notebook__name=options["notebook"])
+        elif options["ids"]:
+            documents = documents.filter(pk__in=options["ids"])
+        else:
+            raise CommandError("Give document ids or --notebook.")
+        model_names = options["models"].split(",")
+        for doc in documents.order_by("page"):
+            page = PageInput.open(doc.file.path)
+            for model_name in model_names:
+                seg = seg_cache.segment(page, model_name)
+                self.stdout.write(
+                    f"Document {doc.pk} {model_name}: {len(seg.lines)} lines"
+                )
+
+    def handle_prune(self, **options):
+        max_bytes = max_age = None
+        if options["max_mb"] is not None:
+            max_bytes = options["max_mb"] * 1024 * 1024
+        if options["max_age_days"] is not None:
+            max_age = options["max_age_days"] * 24 * 3600
+        removed, freed = seg_cache.prune(max_bytes, max_age)
+        self.stdout.write(f"Removed {removed} entries, {freed / 2**20:.1f} MB.")
+
+    def handle_stats(self, **options):
+        entries = seg_cache.entries()
+        size = sum(e.stat().st_size for e in entries)
+        self.stdout.write(
+            f"{len(entries)} entries, {size / 2**20:.1f} MB "
+            f"in {settings.SEGMENTATION_CACHE_DIR}"
+        )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from selector import jobs
+from selector.model_registry import warm_up
+
+
+class Command(BaseCommand):
+    help = "Claims and runs queued segmentation jobs. Several workers may share the queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of polling for new jobs.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls of an empty queue.",
+        )
+        parser.add_argument(
+            "--warmup",
+            action="store_true",
+            help="Load all segmentation models before claiming the first job.",
+        )
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        if options["warmup"]:
+            warm_up()
+        self.stdout.write(f"Segmentation worker {worker} started")
+        requeued = jobs.requeue_orphaned(worker)
+        if requeued:
+            self.stdout.write(f"Queued {requeued} jobs of dead workers again")
+        try:
+            while True:
+                claimed = jobs.claim_next(worker)
+                if not claimed:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+                for job in jobs.run(claimed):
+                    self.stdout.write(
+                        f"Job {job.pk} ({job}): {job.get_status_display()} in {job.duration:.2f}s"
+                    )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Segmentation worker {worker} stopped")
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('selector', '0011_remove_document_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=50, verbose_name='مدل')),
+                ('padding', models.IntegerField(default=10, verbose_name='حاشیه')),
+                ('status', models.SmallIntegerField(choices=[(0, 'در صف'), (1, 'در حال اجرا'), (2, 'انجام شده'), (3, 'خطا')], default=0, verbose_name='وضعیت')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='پردازشگر')),
+                ('error', models.TextField(blank=True, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان ایجاد')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان شروع')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='مدت (ثانیه)')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segmentation_jobs', to='selector.document', verbose_name='سند')),
+            ],
+            options={
+                'verbose_name': 'کار قطعه\u200cبندی',
+                'verbose_name_plural': 'کارهای قطعه\u200cبندی',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='selector_se_status_047fef_idx')],
+            },
+        ),
+    ]
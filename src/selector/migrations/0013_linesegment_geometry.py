@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('selector', '0012_segmentationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linesegment',
+            name='baseline',
+            field=models.JSONField(blank=True, null=True, verbose_name='خط پایه'),
+        ),
+        migrations.AddField(
+            model_name='linesegment',
+            name='padding',
+            field=models.SmallIntegerField(blank=True, null=True, verbose_name='حاشیه'),
+        ),
+        migrations.AddField(
+            model_name='linesegment',
+            name='polygon',
+            field=models.JSONField(blank=True, null=True, verbose_name='چندضلعی'),
+        ),
+        migrations.AlterField(
+            model_name='linesegment',
+            name='file',
+            field=models.FileField(blank=True, upload_to='', verbose_name='فایل'),
+        ),
+    ]
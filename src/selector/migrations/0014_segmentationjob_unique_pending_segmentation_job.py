@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def drop_duplicate_pending_jobs(apps, schema_editor):
+    SegmentationJob = apps.get_model("selector", "SegmentationJob")
+    seen = set()
+    for job in SegmentationJob.objects.filter(status=0).order_by("created_at", "pk"):
+        key = (job.document_id, job.model_name)
+        if key in seen:
+            job.delete()
+        else:
+            seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('selector', '0013_linesegment_geometry'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_pending_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='segmentationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 0)), fields=('document', 'model_name'), name='unique_pending_segmentation_job'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+"""
+Process-wide registry of loaded segmentation models.
+
+Loading a VGSL model takes several seconds, so every worker process keeps the
+models it has used in a small LRU keyed by (absolute path, mtime). Replacing a
+model file on disk therefore invalidates the cached copy on the next lookup.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from kraken.lib.vgsl import TorchVGSLModel
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_models: "OrderedDict[tuple[str, float], TorchVGSLModel]" = OrderedDict()
+
+
+def resolve_model_path(name: str) -> str:
+    """
+    Returns the absolute model file path for a model name from
+    `settings.SEGMENTATION_MODELS`. Unknown names are treated as paths.
+    """
+    path = settings.SEGMENTATION_MODELS.get(name, name)
+    return os.path.abspath(path)
+
+
+def get_model(name: str) -> "TorchVGSLModel":
+    """
+    Returns the loaded model for `name`, loading it on first use.
+
+    Args:
+        name: A key of `settings.SEGMENTATION_MODELS` or a model file path.
+    """
+    from kraken.lib import vgsl
+
+    from .inference import quantize_model, select_device
+
+    path = resolve_model_path(name)
+    key = (path, os.path.getmtime(path))
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+        logger.info(f"Loading segmentation model {path}")
+        model = vgsl.TorchVGSLModel.load_model(path)
+        if settings.SEGMENTATION_QUANTIZE and select_device() == "cpu":
+            quantize_model(model)
+        # drop copies of an older version of the same file
+        for stale in [k for k in _models if k[0] == path]:
+            del _models[stale]
+        _models[key] = model
+        while len(_models) > settings.SEGMENTATION_MODEL_CACHE_SIZE:
+            evicted, _ = _models.popitem(last=False)
+            logger.info(f"Evicting segmentation model {evicted[0]}")
+    return model
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> None:
+    """
+    Loads the given models (default: all configured models) into the
+    registry. Failures are logged so a missing model does not prevent startup.
+    """
+    if names is None:
+        names = settings.SEGMENTATION_MODELS.keys()
+    for name in names:
+        try:
+            get_model(name)
+        except Exception as e:
+            logger.warning(f"Could not warm up segmentation model {name}: {e}")
+
+
+def clear() -> None:
+    """Drops all cached models."""
+    with _lock:
+        _models.clear()
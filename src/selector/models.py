@@ -54,7 +54,8 @@ class Document(models.Model):
 
 
 class LineSegment(models.Model):
-    file = models.FileField(verbose_name=_("فایل"))
+    # Without a file the line image is rendered from the page and the geometry
+    file = models.FileField(blank=True, verbose_name=_("فایل"))
     order = models.IntegerField(verbose_name=_("ترتیب"))
     document = models.ForeignKey(
         Document,
@@ -64,6 +65,10 @@ class LineSegment(models.Model):
     )
     transcription = models.TextField(blank=True, verbose_name=_("رونوشت"))
     transcribed = models.BooleanField(default=False, verbose_name=_("رونوشت شده"))
+    # Undilated line polygon and baseline in page pixel coordinates
+    polygon = models.JSONField(null=True, blank=True, verbose_name=_("چندضلعی"))
+    baseline = models.JSONField(null=True, blank=True, verbose_name=_("خط پایه"))
+    padding = models.SmallIntegerField(null=True, blank=True, verbose_name=_("حاشیه"))
 
     class VerifiedState(models.IntegerChoices):
         UNCHECKED = 0, _("بررسی نشده")
@@ -95,6 +100,18 @@ class LineSegment(models.Model):
         verbose_name = _("تکه خط")
         verbose_name_plural = _("تکه‌های خط")
 
+    @property
+    def has_geometry(self) -> bool:
+        return self.polygon is not None and self.baseline is not None
+
+    @property
+    def image_url(self) -> str:
+        if self.file:
+            return self.file.url
+        from django.urls import reverse
+
+        return reverse("line-crop", args=[self.pk])
+
     def save(self, *args, **kwargs):
         self.__cleanup_transcription()
         # Set transcribed to True if transcription is non-empty, else False
@@ -121,3 +138,50 @@ def sync_name_with_file(sender, instance, created, **kwargs):
         if not instance.page:
             instance.page = int(base_name.rsplit("_", 1)[1][1:])
             instance.save(update_fields=["page"])
+
+
+class SegmentationJob(models.Model):
+    # A queued run of one segmentation model over one document
+    class Status(models.IntegerChoices):
+        PENDING = 0, _("در صف")
+        RUNNING = 1, _("در حال اجرا")
+        DONE = 2, _("انجام شده")
+        FAILED = 3, _("خطا")
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="segmentation_jobs",
+        verbose_name=_("سند"),
+    )
+    model_name = models.CharField(max_length=50, verbose_name=_("مدل"))
+    padding = models.IntegerField(default=10, verbose_name=_("حاشیه"))
+    status = models.SmallIntegerField(
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name=_("وضعیت"),
+    )
+    worker = models.CharField(max_length=100, blank=True, verbose_name=_("پردازشگر"))
+    error = models.TextField(blank=True, verbose_name=_("خطا"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("زمان ایجاد"))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_("زمان شروع"))
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("زمان پایان")
+    )
+    duration = models.FloatField(null=True, blank=True, verbose_name=_("مدت (ثانیه)"))
+
+    class Meta:
+        verbose_name = _("کار قطعه‌بندی")
+        verbose_name_plural = _("کارهای قطعه‌بندی")
+        indexes = [models.Index(fields=["status", "created_at"])]
+        constraints = [
+            # at most one queued (status PENDING) job per document and model
+            models.UniqueConstraint(
+                fields=["document", "model_name"],
+                condition=models.Q(status=0),
+                name="unique_pending_segmentation_job",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.document} / {self.model_name}"
@@ -0,0 +1,280 @@
+"""
+On-disk cache of segmentation results.
+
+A result is keyed by the SHA-256 of the page file, the SHA-256 of the model
+file and the text direction, so re-segmenting an unchanged page with an
+unchanged model skips neural inference. Entries are gzipped JSON files under
+`settings.SEGMENTATION_CACHE_DIR`. Reading an entry refreshes its mtime and
+`prune` evicts the least recently used entries.
+"""
+
+import dataclasses
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from django.conf import settings
+
+from .model_registry import resolve_model_path
+
+if TYPE_CHECKING:
+    from kraken.containers import Segmentation
+    from kraken.lib.vgsl import TorchVGSLModel
+
+    from .blla import PageInput
+
+logger = logging.getLogger(__name__)
+
+# temporary files are renamed into place right after writing, older ones
+# belong to a writer that died
+TMP_MAX_AGE = 3600
+
+_lock = threading.Lock()
+# model file digests by (path, mtime), hashing a model takes a moment
+_model_digests: dict[tuple[str, float], str] = {}
+
+
+def enabled() -> bool:
+    return bool(settings.SEGMENTATION_CACHE_DIR)
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def model_digest(name: str) -> str:
+    """SHA-256 of the file of a configured model, memoized per mtime."""
+    path = resolve_model_path(name)
+    key = (path, os.path.getmtime(path))
+    with _lock:
+        if key not in _model_digests:
+            _model_digests[key] = file_digest(path)
+        return _model_digests[key]
+
+
+def cache_key(
+    page_path: str, model_name: str, text_direction: str, input_scale: float = 1.0
+) -> str:
+    parts = [file_digest(page_path), model_digest(model_name), text_direction]
+    # quantized models, downscaled inputs and faster vectorizers give
+    # slightly different lines
+    if settings.SEGMENTATION_QUANTIZE:
+        parts.append("int8")
+    if settings.SEGMENTATION_VECTORIZER != "exact":
+        parts.append(f"vectorizer={settings.SEGMENTATION_VECTORIZER}")
+    if input_scale != 1.0:
+        parts.append(f"scale={input_scale}")
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(settings.SEGMENTATION_CACHE_DIR, key[:2], f"{key}.json.gz")
+
+
+def _to_json(obj):
+    # numpy arrays/scalars and torch tensors in line orders and coordinates
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj)}")
+
+
+def load(key: str) -> Optional["Segmentation"]:
+    """Returns the cached segmentation for `key` or None."""
+    from kraken.containers import Segmentation
+
+    path = _entry_path(key)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fp:
+            data = json.load(fp)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Dropping unreadable segmentation cache entry {path}: {e}")
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    # mark as recently used for LRU eviction, unless pruned meanwhile
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return Segmentation(**data)
+
+
+def store(key: str, seg: "Segmentation") -> None:
+    """Writes a segmentation to the cache atomically."""
+    path = _entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = json.dumps(
+        dataclasses.asdict(seg), default=_to_json, separators=(",", ":")
+    ).encode("utf-8")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(gzip.compress(data))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _scan(root: str, suffix: str) -> list[os.DirEntry]:
+    found = []
+    for sub in os.scandir(root):
+        if sub.is_dir():
+            try:
+                found.extend(
+                    e for e in os.scandir(sub.path) if e.name.endswith(suffix)
+                )
+            except FileNotFoundError:
+                pass
+    return found
+
+
+def _stat(entry: os.DirEntry) -> Optional[os.stat_result]:
+    # None for entries removed by a concurrent prune
+    try:
+        return entry.stat()
+    except FileNotFoundError:
+        return None
+
+
+def entries(
+    root: Optional[str] = None, suffix: str = ".json.gz"
+) -> list[os.DirEntry]:
+    """
+    All entries of a cache directory sharded by key prefix, least recently
+    used first. `root` defaults to `SEGMENTATION_CACHE_DIR`. Entries removed
+    while listing are left out.
+    """
+    root = root or settings.SEGMENTATION_CACHE_DIR
+    if not os.path.isdir(root):
+        return []
+    # DirEntry caches its stat, so later stat() calls cannot fail
+    found = [e for e in _scan(root, suffix) if _stat(e) is not None]
+    return sorted(found, key=lambda e: e.stat().st_mtime)
+
+
+def _prune_temp_files(root: str) -> tuple[int, int]:
+    if not os.path.isdir(root):
+        return 0, 0
+    cutoff = time.time() - TMP_MAX_AGE
+    removed = freed = 0
+    for entry in _scan(root, ".tmp"):
+        stat = _stat(entry)
+        if stat is None or stat.st_mtime >= cutoff:
+            continue
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += stat.st_size
+    return removed, freed
+
+
+def prune(
+    max_bytes: Optional[int] = None,
+    max_age: Optional[float] = None,
+    root: Optional[str] = None,
+    suffix: str = ".json.gz",
+) -> tuple[int, int]:
+    """
+    Evicts entries unused for more than `max_age` seconds, then least
+    recently used entries until the cache fits in `max_bytes`. Defaults come
+    from `SEGMENTATION_CACHE_MAX_MB` and `SEGMENTATION_CACHE_MAX_AGE_DAYS`.
+    `root` and `suffix` select another cache laid out the same way.
+    Temporary files older than `TMP_MAX_AGE` seconds, left behind by writers
+    that died before renaming them into place, are removed too.
+
+    Returns:
+        The number of removed entries and the number of bytes freed.
+    """
+    if max_bytes is None:
+        max_bytes = settings.SEGMENTATION_CACHE_MAX_MB * 1024 * 1024
+    if max_age is None:
+        max_age = settings.SEGMENTATION_CACHE_MAX_AGE_DAYS * 24 * 3600
+    removed, freed = _prune_temp_files(root or settings.SEGMENTATION_CACHE_DIR)
+    found = entries(root, suffix)
+    total = sum(e.stat().st_size for e in found)
+    cutoff = time.time() - max_age if max_age else None
+    for entry in found:
+        stat = entry.stat()
+        if not (cutoff is not None and stat.st_mtime < cutoff) and (
+            not max_bytes or total <= max_bytes
+        ):
+            break
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        total -= stat.st_size
+        removed += 1
+        freed += stat.st_size
+    if removed:
+        logger.info(f"Pruned {removed} cache entries ({freed} bytes)")
+    return removed, freed
+
+
+def lookup(
+    page_path: Optional[str],
+    model_name: str,
+    text_direction: str = "horizontal-rl",
+    input_scale: Optional[float] = None,
+) -> Optional["Segmentation"]:
+    """
+    Returns the cached segmentation of a page file by a configured model, or
+    None if there is none or the cache is disabled. `input_scale` defaults to
+    `SEGMENTATION_INPUT_SCALE`.
+    """
+    if not enabled() or not page_path:
+        return None
+    if input_scale is None:
+        input_scale = settings.SEGMENTATION_INPUT_SCALE
+    seg = load(cache_key(page_path, model_name, text_direction, input_scale))
+    if seg is not None:
+        logger.info(f"Using cached {model_name} segmentation of {page_path}")
+    return seg
+
+
+def segment(
+    page: "PageInput",
+    model_name: str,
+    text_direction: str = "horizontal-rl",
+    model: Optional["TorchVGSLModel"] = None,
+    input_scale: Optional[float] = None,
+) -> "Segmentation":
+    """
+    Segments a page with a configured model, reusing a cached result for the
+    same page file, model file, text direction and input scale. The model is
+    only loaded on a cache miss. An explicitly passed `model` bypasses the
+    cache as its file is unknown. `input_scale` defaults to
+    `SEGMENTATION_INPUT_SCALE`.
+    """
+    from .inference import segment_page
+    from .model_registry import get_model
+
+    if input_scale is None:
+        input_scale = settings.SEGMENTATION_INPUT_SCALE
+    if model is not None:
+        return segment_page(page, model, text_direction, input_scale)
+    seg = lookup(page.path, model_name, text_direction, input_scale)
+    if seg is None:
+        seg = segment_page(page, get_model(model_name), text_direction, input_scale)
+        if enabled() and page.path:
+            key = cache_key(page.path, model_name, text_direction, input_scale)
+            # the cache is best effort, a failed write must not lose the result
+            try:
+                store(key, seg)
+            except OSError as e:
+                logger.warning(f"Could not cache {model_name} segmentation of {page.path}: {e}")
+    return seg
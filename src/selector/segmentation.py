@@ -16,8 +16,15 @@
 Processing for baseline segmenter output
 """
 
+import copy
+import dataclasses
 import logging
-from collections import defaultdict
+import math
+import multiprocessing
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
 from typing import (
     TYPE_CHECKING,
     Dict,
@@ -31,6 +38,7 @@ from typing import (
 )
 
 import numpy as np
+import shapely
 import shapely.geometry as geom
 import torch
 import torch.nn.functional as F
@@ -43,8 +51,10 @@ from scipy.ndimage import (
     maximum_filter,
     affine_transform,
 )
-from scipy.signal import convolve2d
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
 from scipy.spatial.distance import pdist, squareform
+from shapely import STRtree
 from shapely.ops import nearest_points, unary_union
 from shapely.validation import explain_validity
 from skimage import draw, filters
@@ -53,6 +63,7 @@ from skimage.graph import MCP_Connect
 from skimage.measure import approximate_polygon, label, regionprops, subdivide_polygon
 from skimage.morphology import skeletonize
 from skimage.transform import AffineTransform, PiecewiseAffineTransform, warp
+from skimage.util import img_as_float32, img_as_float64
 
 from kraken.lib import default_specs
 from kraken.lib.exceptions import KrakenInputException
@@ -69,8 +80,10 @@ logger = logging.getLogger("kraken")
 
 __all__ = [
     "reading_order",
+    "lines_in_regions",
     "neural_reading_order",
     "vectorize_lines",
+    "VECTORIZERS",
     "calculate_polygonal_environment",
     "polygonal_reading_order",
     "scale_polygonal_lines",
@@ -116,66 +129,71 @@ def reading_order(
     )
 
     order = np.zeros((len(lines), len(lines)), "B")
+    if not len(lines):
+        return order
+
+    r_start, r_stop, c_start, c_stop = np.array(
+        [(u[0].start, u[0].stop, u[1].start, u[1].stop) for u in lines]
+    ).T
+    # lines with equal slices never separate each other
+    keys = {}
+    key = np.array(
+        [
+            keys.setdefault(
+                (u[0].start, u[0].stop, u[0].step, u[1].start, u[1].stop, u[1].step),
+                len(keys),
+            )
+            for u in lines
+        ]
+    )
 
-    def _x_overlaps(u, v):
-        return u[1].start < v[1].stop and u[1].stop > v[1].start
-
-    def _above(u, v):
-        return u[0].start < v[0].start
-
-    def _left_of(u, v):
-        return u[1].stop < v[1].start
-
-    def _separates(w, u, v):
-        if w == u or w == v:
-            return 0
-        if w[0].stop < min(u[0].start, v[0].start):
-            return 0
-        if w[0].start > max(u[0].stop, v[0].stop):
-            return 0
-        if w[1].start < u[1].stop and w[1].stop > v[1].start:
-            return 1
-        return 0
-
-    if text_direction == "rl":
-
-        def horizontal_order(u, v):
-            return not _left_of(u, v)
-    else:
-        horizontal_order = _left_of
-
-    for i, u in enumerate(lines):
-        for j, v in enumerate(lines):
-            if _x_overlaps(u, v):
-                if _above(u, v):
-                    order[i, j] = 1
-            else:
-                if [w for w in lines if _separates(w, u, v)] == []:
-                    if horizontal_order(u, v):
-                        order[i, j] = 1
+    x_overlaps = (c_start[:, None] < c_stop) & (c_stop[:, None] > c_start)
+    order[x_overlaps & (r_start[:, None] < r_start)] = 1
+
+    left_of = c_stop[:, None] < c_start
+    horizontal_order = ~left_of if text_direction == "rl" else left_of
+    # pairs ordered horizontally unless a third line separates them
+    pairs = ~x_overlaps & horizontal_order
+    for i in np.flatnonzero(pairs.any(axis=1)):
+        (js,) = np.nonzero(pairs[i])
+        # separators start left of the end of u and span the rows of u and v
+        (ws,) = np.nonzero((c_start < c_stop[i]) & (key != key[i]))
+        lo = np.minimum(r_start[i], r_start[js])[:, None]
+        hi = np.maximum(r_stop[i], r_stop[js])[:, None]
+        separated = (
+            (r_stop[ws] >= lo)
+            & (r_start[ws] <= hi)
+            & (c_stop[ws] > c_start[js][:, None])
+            & (key[ws] != key[js][:, None])
+        ).any(axis=1)
+        order[i, js[~separated]] = 1
     return order
 
 
 def topsort(order: np.ndarray) -> list[int]:
     """Given a binary array defining a partial order (o[i,j]==True means i<j),
-    compute a topological sort.  This is a quick and dirty implementation
-    that works for up to a few thousand elements."""
+    compute a topological sort.  Depth-first with an explicit stack, so long
+    chains of lines do not hit the recursion limit."""
     logger.info("Perform topological sort on partially ordered lines")
     n = len(order)
     visited = np.zeros(n)
     L = []
 
-    def _visit(k):
+    for k in range(n):
         if visited[k]:
-            return
+            continue
         visited[k] = 1
-        (a,) = np.nonzero(np.ravel(order[:, k]))
-        for line in a:
-            _visit(line)
-        L.append(k)
-
-    for k in range(n):
-        _visit(k)
+        stack = [(k, iter(np.nonzero(np.ravel(order[:, k]))[0]))]
+        while stack:
+            node, predecessors = stack[-1]
+            for line in predecessors:
+                if not visited[line]:
+                    visited[line] = 1
+                    stack.append((line, iter(np.nonzero(np.ravel(order[:, line]))[0])))
+                    break
+            else:
+                stack.pop()
+                L.append(node)
     return L
 
 
@@ -250,9 +268,47 @@ def boundary_tracing(region):
     return np.array(boundary)
 
 
+def trace_boundaries(labelled: np.ndarray) -> Dict[int, np.ndarray]:
+    """
+    Finds the outer boundaries of all blobs of a labelled map with a single
+    `cv2.findContours` call.
+
+    Boundaries have the point order and orientation of `boundary_tracing`:
+    (row, col) pixel coordinates, clockwise from the upper left pixel of the
+    blob, with pixels on one pixel wide parts repeated on the way back.
+    Unlike `boundary_tracing` blobs touching the top or left border of the
+    map are traced as well.
+
+    Args:
+        labelled: Label map, e.g. from skimage.measure.label(), with blobs
+                  that are not 8-connected to each other.
+
+    Returns:
+        A dict mapping each blob label to its boundary.
+    """
+    # padding keeps blobs on the border of the map off the image border
+    contours, hierarchy = cv2.findContours(
+        np.pad(labelled > 0, 1).astype(np.uint8),
+        cv2.RETR_CCOMP,
+        cv2.CHAIN_APPROX_NONE,
+        offset=(-1, -1),
+    )
+    boundaries = {}
+    for contour, (_, _, _, parent) in zip(contours, hierarchy[0] if contours else []):
+        # skip hole boundaries
+        if parent != -1:
+            continue
+        contour = contour[:, 0, ::-1]
+        # OpenCV traces counter-clockwise from the same start pixel
+        contour = np.concatenate((contour[:1], contour[:0:-1]))
+        boundaries[labelled[contour[0, 0], contour[0, 1]]] = contour
+    return boundaries
+
+
 def _extend_boundaries(baselines, bin_bl_map):
     # find baseline blob boundaries
     labelled = label(bin_bl_map)
+    blob_boundaries = trace_boundaries(labelled)
     boundaries = []
     for x in regionprops(labelled):
         try:
@@ -262,61 +318,169 @@ def _extend_boundaries(baselines, bin_bl_map):
                     f"Skipping baseline extension for very small blob of area {x.area}"
                 )
                 continue
-            b = boundary_tracing(x)
+            b = blob_boundaries[x.label]
             if len(b) > 3:
                 boundaries.append(geom.Polygon(b).simplify(0.01).buffer(0))
         except Exception as e:
             logger.warning(f"Boundary tracing failed in baseline elongation: {e}")
             continue
 
-    # extend lines to polygon boundary
-    for bl in baselines:
-        ls = geom.LineString(bl)
-        try:
-            boundary_pol = next(filter(lambda x: x.contains(ls), boundaries))
-        except Exception:
+    if not boundaries or not baselines:
+        return baselines
+    # blob containing each line, the first traced one as in a linear scan
+    tree = STRtree(boundaries)
+    line_idx, blob_idx = tree.query(
+        [geom.LineString(bl) for bl in baselines], predicate="within"
+    )
+    if not len(line_idx):
+        return baselines
+    first = np.unique(line_idx, return_index=True)[1]
+    line_idx, blob_idx = line_idx[first], blob_idx[first]
+    boundary_pols = tree.geometries.take(blob_idx)
+    lines = [baselines[i] for i in line_idx]
+
+    # extend lines to polygon boundary, the right end after the left one as
+    # the right ray of two point lines starts at the extended left end
+    for end, prev in ((0, 1), (-1, -2)):
+        ends = np.array([bl[end] for bl in lines], dtype=float)
+        inside = shapely.contains_xy(boundary_pols, ends[:, 0], ends[:, 1])
+        if not inside.any():
             continue
-        # 'left' side
-        if boundary_pol.contains(geom.Point(bl[0])):
-            l_point = boundary_pol.boundary.intersection(
-                geom.LineString(
-                    [
-                        (
-                            bl[0][0] - 10 * (bl[1][0] - bl[0][0]),
-                            bl[0][1] - 10 * (bl[1][1] - bl[0][1]),
-                        ),
-                        bl[0],
-                    ]
-                )
-            )
-            if l_point.geom_type != "Point":
-                bl[0] = np.array(
-                    nearest_points(geom.Point(bl[0]), boundary_pol)[1].coords[0], "int"
-                ).tolist()
-            else:
-                bl[0] = np.array(l_point.coords[0], "int").tolist()
-        # 'right' side
-        if boundary_pol.contains(geom.Point(bl[-1])):
-            r_point = boundary_pol.boundary.intersection(
-                geom.LineString(
-                    [
-                        (
-                            bl[-1][0] - 10 * (bl[-2][0] - bl[-1][0]),
-                            bl[-1][1] - 10 * (bl[-2][1] - bl[-1][1]),
-                        ),
-                        bl[-1],
-                    ]
-                )
-            )
-            if r_point.geom_type != "Point":
-                bl[-1] = np.array(
-                    nearest_points(geom.Point(bl[-1]), boundary_pol)[1].coords[0], "int"
-                ).tolist()
-            else:
-                bl[-1] = np.array(r_point.coords[0], "int").tolist()
+        ends = ends[inside]
+        prevs = np.array([bl[prev] for bl in lines], dtype=float)[inside]
+        pols = boundary_pols[inside]
+        rays = shapely.linestrings(np.stack((ends - 10 * (prevs - ends), ends), axis=1))
+        points = shapely.intersection(shapely.boundary(pols), rays)
+        # the nearest boundary point unless the ray hits it exactly once
+        missed = (shapely.get_type_id(points) != shapely.GeometryType.POINT) | (
+            shapely.is_empty(points)
+        )
+        points[missed] = shapely.get_point(
+            shapely.shortest_line(shapely.points(ends[missed]), pols[missed]), -1
+        )
+        coords = np.array(shapely.get_coordinates(points), "int").tolist()
+        for idx, coord in zip(np.flatnonzero(inside), coords):
+            lines[idx][end] = coord
     return baselines
 
 
+def _gaussian_kernel1d(sigma: float, order: int, radius: int) -> np.ndarray:
+    """
+    Correlation weights of `scipy.ndimage.gaussian_filter1d` of order 0 or 1.
+    """
+    x = np.arange(-radius, radius + 1)
+    phi = np.exp(-0.5 / (sigma * sigma) * x**2)
+    phi /= phi.sum()
+    if order == 1:
+        phi = -x / (sigma * sigma) * phi
+    return phi[::-1]
+
+
+def _sato_cv2(
+    im: np.ndarray, sigmas=range(1, 10, 2), downsample: int = 1
+) -> np.ndarray:
+    """
+    `filters.sato(im, sigmas, black_ridges=False, mode="constant")` computed
+    with OpenCV separable filters in float32, optionally on the map
+    downsampled by `downsample`.
+
+    At full resolution the Gaussian derivative kernels equal skimage's and
+    the result only differs by float32 rounding.
+    """
+    im = -im.astype(np.float32)
+    h, w = im.shape
+    if downsample > 1:
+        im = cv2.resize(
+            im,
+            (max(1, round(w / downsample)), max(1, round(h / downsample))),
+            interpolation=cv2.INTER_AREA,
+        )
+    filtered_max = np.zeros_like(im)
+    for sigma in sigmas:
+        sigma = sigma / downsample
+        # two first order derivatives of sigma / sqrt(2) make up the
+        # second order one, with skimage's truncation
+        scaled = sigma / math.sqrt(2)
+        radius = int((8 if sigma > 1 else 100) * scaled + 0.5)
+        g0 = _gaussian_kernel1d(scaled, 0, radius).astype(np.float32)
+        g1 = _gaussian_kernel1d(scaled, 1, radius).astype(np.float32)
+
+        def _filter(a, kernel_c, kernel_r):
+            return cv2.sepFilter2D(
+                a, cv2.CV_32F, kernel_c, kernel_r, borderType=cv2.BORDER_CONSTANT
+            )
+
+        grad_r = _filter(im, g0, g1)
+        grad_c = _filter(im, g1, g0)
+        h_rr = _filter(grad_r, g0, g1)
+        h_rc = _filter(grad_r, g1, g0)
+        h_cc = _filter(grad_c, g1, g0)
+        # largest eigenvalue of the hessian
+        eigval = (h_rr + h_cc) / 2 + np.sqrt(h_rc**2 + ((h_rr - h_cc) / 2) ** 2)
+        filtered_max = np.maximum(filtered_max, sigma**2 * np.maximum(eigval, 0))
+    if downsample > 1:
+        filtered_max = cv2.resize(filtered_max, (w, h), interpolation=cv2.INTER_LINEAR)
+    return filtered_max
+
+
+def _component_paths(line_skel: np.ndarray, line_extrema: np.ndarray) -> list:
+    """
+    Longest path through each skeleton component containing an end point, as
+    (row, col) pixel arrays. An alternative to pairing end points by the
+    meeting points of `LineMCP` that yields one line per component.
+    """
+    coords = np.argwhere(line_skel)
+    index = np.full(line_skel.shape, -1, dtype=np.int64)
+    index[tuple(coords.T)] = np.arange(len(coords))
+    # 8-connected pixel graph with euclidean step lengths
+    src, dst, weights = [], [], []
+    for offset, weight in (
+        ((0, 1), 1),
+        ((1, -1), math.sqrt(2)),
+        ((1, 0), 1),
+        ((1, 1), math.sqrt(2)),
+    ):
+        nbr = coords + offset
+        valid = np.flatnonzero(
+            (nbr[:, 0] < line_skel.shape[0])
+            & (nbr[:, 1] >= 0)
+            & (nbr[:, 1] < line_skel.shape[1])
+        )
+        nbr_idx = index[nbr[valid, 0], nbr[valid, 1]]
+        src.append(valid[nbr_idx >= 0])
+        dst.append(nbr_idx[nbr_idx >= 0])
+        weights.append(np.full(len(dst[-1]), weight))
+    graph = csr_matrix(
+        (np.concatenate(weights), (np.concatenate(src), np.concatenate(dst))),
+        shape=(len(coords), len(coords)),
+    )
+    _, component = connected_components(graph, directed=False)
+
+    def _farthest(dist):
+        # last pixel of each reached component by distance
+        (reached,) = np.nonzero(np.isfinite(dist))
+        order = reached[np.lexsort((dist[reached], component[reached]))]
+        return order[np.r_[component[order][1:] != component[order][:-1], True]]
+
+    # the pixel farthest from an end point and the pixel farthest from it
+    # delimit the longest path of a component
+    ends = index[tuple(line_extrema.T)]
+    _, first = np.unique(component[ends], return_index=True)
+    dist = dijkstra(graph, directed=False, indices=ends[first], min_only=True)
+    starts = _farthest(dist)
+    dist, predecessors, _ = dijkstra(
+        graph, directed=False, indices=starts, min_only=True, return_predecessors=True
+    )
+    paths = []
+    for node in _farthest(dist):
+        path = [node]
+        while predecessors[path[-1]] >= 0:
+            path.append(predecessors[path[-1]])
+        if len(path) > 1:
+            paths.append(coords[path])
+    return paths
+
+
 class LineMCP(MCP_Connect):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -342,11 +506,23 @@ class LineMCP(MCP_Connect):
         return 2 if float_cumcost else 0
 
 
+# stage selections of `vectorize_lines` by name
+VECTORIZERS = {
+    "exact": {},
+    "cv2": {"ridge_filter": "cv2"},
+    "fast": {"ridge_filter": "cv2", "ridge_downsample": 2, "pairing": "components"},
+}
+
+
 def vectorize_lines(
     im: np.ndarray,
     threshold: float = 0.17,
     min_length=5,
     text_direction: str = "horizontal",
+    ridge_filter: Literal["skimage", "cv2"] = "skimage",
+    ridge_downsample: int = 1,
+    thinning: Literal["skimage", "cv2"] = "skimage",
+    pairing: Literal["mcp", "components"] = "mcp",
 ):
     """
     Vectorizes lines from a binarized array.
@@ -359,6 +535,19 @@ def vectorize_lines(
         min_length (int): Minimal length of output baselines.
         text_direction (str): Base orientation of the text line (horizontal or
                               vertical).
+        ridge_filter (str): Sato ridge filter implementation, `skimage` or
+                            the float32 OpenCV port `cv2`.
+        ridge_downsample (int): Runs the `cv2` ridge filter on the baseline
+                                map downsampled by this factor.
+        thinning (str): Skeletonization with `skimage` or with the OpenCV
+                        (contrib) Zhang-Suen thinning `cv2`.
+        pairing (str): Connects end points through the skeleton with
+                       `mcp` (minimum cost paths between all end points
+                       meeting each other) or `components` (the longest path
+                       through each connected component).
+
+    The defaults reproduce kraken's vectorizer, `VECTORIZERS` names faster
+    stage selections.
 
     Returns:
         [[x0, y0, ... xn, yn], [xm, ym, ..., xk, yk], ... ]
@@ -371,23 +560,36 @@ def vectorize_lines(
     st_map = im[0]
     end_map = im[1]
     bl_map = im[2]
-    bl_map = filters.sato(bl_map, black_ridges=False, mode="constant")
+    if ridge_filter == "cv2":
+        bl_map = _sato_cv2(bl_map, downsample=ridge_downsample)
+    else:
+        bl_map = filters.sato(bl_map, black_ridges=False, mode="constant")
     bin_bl_map = bl_map > threshold
     # skeletonize
-    line_skel = skeletonize(bin_bl_map)
+    if thinning == "cv2":
+        line_skel = cv2.ximgproc.thinning(bin_bl_map.astype(np.uint8) * 255) > 0
+    else:
+        line_skel = skeletonize(bin_bl_map)
     # find end points
-    kernel = np.array([[1, 1, 1], [1, 10, 1], [1, 1, 1]])
-    line_extrema = np.transpose(
-        np.where((convolve2d(line_skel, kernel, mode="same") == 11) * line_skel)
+    kernel = np.array([[1, 1, 1], [1, 10, 1], [1, 1, 1]], dtype=np.float32)
+    neighbours = cv2.filter2D(
+        line_skel.astype(np.float32), -1, kernel, borderType=cv2.BORDER_CONSTANT
     )
+    line_extrema = np.transpose(np.where((neighbours == 11) * line_skel))
 
-    mcp = LineMCP(~line_skel)
-    try:
-        mcp.find_costs(line_extrema)
-    except ValueError:
-        return []
+    if pairing == "components":
+        if not len(line_extrema):
+            return []
+        connections = _component_paths(line_skel, line_extrema)
+    else:
+        mcp = LineMCP(~line_skel)
+        try:
+            mcp.find_costs(line_extrema)
+        except ValueError:
+            return []
+        connections = mcp.get_connections()
 
-    lines = [approximate_polygon(line, 3).tolist() for line in mcp.get_connections()]
+    lines = [approximate_polygon(line, 3).tolist() for line in connections]
     # extend baselines to blob boundary
     lines = _extend_boundaries(lines, bin_bl_map)
 
@@ -442,9 +644,10 @@ def vectorize_regions(im: np.ndarray, threshold: float = 0.5):
     """
     bin = im > threshold
     labelled = label(bin)
+    blob_boundaries = trace_boundaries(labelled)
     boundaries = []
     for x in regionprops(labelled):
-        boundary = boundary_tracing(x)
+        boundary = blob_boundaries[x.label]
         if len(boundary) > 2:
             boundaries.append(geom.Polygon(boundary))
     # merge regions that overlap
@@ -465,6 +668,7 @@ def _rotate(
     cval: int | tuple = 0,
     order: int = 0,
     use_skimage_warp: bool = False,
+    use_cv2_warp: bool = False,
 ) -> tuple[AffineTransform, _T_pil_or_np]:
     """
     Rotate an image at an angle with optional scaling
@@ -476,6 +680,10 @@ def _rotate(
         scale (float): x-Axis scaling factor
         cval (int): Padding value
         order (int): Interpolation order
+        use_skimage_warp (bool): Warp ndarrays with skimage instead of scipy
+        use_cv2_warp (bool): Warp ndarrays with OpenCV, much faster than
+                             both. Supports float32/float64 and uint8 images
+                             with nearest (0) or linear (1) interpolation.
     Returns:
         A tuple containing the transformation matrix and the rotated image.
     Note: this function is much faster applied on PIL images than on numpy ndarrays.
@@ -521,6 +729,18 @@ def _rotate(
             fillcolor=cval,
         )
 
+    if use_cv2_warp:
+        # tform maps output to input coordinates like the inverse map of warp
+        return tform, cv2.warpAffine(
+            image,
+            tform.params[:2],
+            output_shape[::-1],
+            flags=(cv2.INTER_LINEAR if order else cv2.INTER_NEAREST)
+            | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=cval,
+        )
+
     # params for scipy
     # swap X and Y axis for scipy
     pdata = tform.params.copy()[[1, 0, 2], :][:, [1, 0, 2]]
@@ -549,47 +769,193 @@ def _rotate(
         )
 
 
-def line_regions(line, regions):
+def line_regions(line, regions, polygons=None):
     """
     Filters a list of regions by line association.
 
     Args:
         line (list): Polyline representing the line.
         regions (list): list of region polygons
+        polygons (np.ndarray): `regions` as shapely polygons, built once by
+                               the caller when filtering many lines.
 
     Returns:
         A list of regions that contain the line mid-point.
     """
-    mid_point = geom.LineString(line).interpolate(0.5, normalized=True)
+    if polygons is None:
+        polygons = [geom.Polygon(x) for x in regions]
+    (reg_idxs,) = np.nonzero(lines_in_regions([line], polygons)[0])
+    return [regions[reg_idx] for reg_idx in reg_idxs]
 
-    reg_pols = [geom.Polygon(x) for x in regions]
-    regs = []
-    for reg_idx, reg_pol in enumerate(reg_pols):
-        if reg_pol.contains(mid_point):
-            regs.append(regions[reg_idx])
-    return regs
+
+def lines_in_regions(lines, regions) -> np.ndarray:
+    """
+    Vectorized `is_in_region` of every line against every region.
+
+    Args:
+        lines: Polylines or shapely line strings.
+        regions: Region polygons. The polygons are prepared in place.
+
+    Returns:
+        A boolean array of shape (len(lines), len(regions)), True where the
+        region contains the mid point of the line.
+    """
+    regions = np.asarray(list(regions), dtype=object)
+    if not len(lines) or not len(regions):
+        return np.zeros((len(lines), len(regions)), dtype=bool)
+    lines = [x if isinstance(x, geom.LineString) else geom.LineString(x) for x in lines]
+    mid_points = shapely.get_coordinates(
+        shapely.line_interpolate_point(lines, 0.5, normalized=True)
+    )
+    shapely.prepare(regions)
+    return shapely.contains_xy(
+        regions[np.newaxis, :], mid_points[:, :1], mid_points[:, 1:]
+    )
 
 
 def _ray_intersect_boundaries(ray, direction, aabb):
     """
     Simplified version of [0] for 2d and AABB anchored at (0,0).
 
+    `ray` is a single origin or an array of origins of shape (N, 2) sharing
+    `direction`. Minima and maxima follow the builtin `min`/`max`, so a NaN
+    from a ray starting on an axis-aligned boundary has the same outcome as
+    for a single origin.
+
     [0] http://gamedev.stackexchange.com/questions/18436/most-efficient-aabb-vs-ray-collision-algorithms
     """
     dir_fraction = np.empty(2, dtype=ray.dtype)
     dir_fraction[direction == 0.0] = np.inf
     dir_fraction[direction != 0.0] = np.divide(1.0, direction[direction != 0.0])
 
-    t1 = (-ray[0]) * dir_fraction[0]
-    t2 = (aabb[0] - ray[0]) * dir_fraction[0]
-    t3 = (-ray[1]) * dir_fraction[1]
-    t4 = (aabb[1] - ray[1]) * dir_fraction[1]
+    t1 = (-ray[..., 0]) * dir_fraction[0]
+    t2 = (aabb[0] - ray[..., 0]) * dir_fraction[0]
+    t3 = (-ray[..., 1]) * dir_fraction[1]
+    t4 = (aabb[1] - ray[..., 1]) * dir_fraction[1]
+
+    def _min(a, b):
+        return np.where(b < a, b, a)
 
-    tmin = max(min(t1, t2), min(t3, t4))
-    tmax = min(max(t1, t2), max(t3, t4))
+    def _max(a, b):
+        return np.where(b > a, b, a)
 
-    t = min(x for x in [tmin, tmax] if x >= 0)
-    return ray + (direction * t)
+    tmin = _max(_min(t1, t2), _min(t3, t4))
+    tmax = _min(_max(t1, t2), _max(t3, t4))
+
+    valid_min = tmin >= 0
+    valid_max = tmax >= 0
+    if not np.all(valid_min | valid_max):
+        raise ValueError("Ray does not intersect the bounding box")
+    t = np.where(
+        valid_min & valid_max, _min(tmin, tmax), np.where(valid_min, tmin, tmax)
+    )
+    return ray + (direction * t[..., None])
+
+
+def _carve_seam(energy: np.ndarray) -> np.ndarray:
+    """
+    Finds the minimum energy seam running left to right through `energy`,
+    moving at most one row between neighbouring columns.
+
+    The first and last rows of `energy` are infinity padding. The cumulative
+    energy is computed one contiguous column at a time, rounding each step's
+    minimum to float32 as the original strided implementation did, and the
+    predecessors are only looked up along the final seam. Ties go to the
+    upper row like `np.argmin`, so seams are identical to the original.
+
+    Returns:
+        The (unpadded) seam row of every column.
+    """
+    cum = energy.T.copy()
+    c, r = cum.shape
+    if c < 2:
+        raise IndexError("Seam carving needs at least two columns")
+    # row views of the predecessors above, level and below, made once
+    above, level, below = list(cum[:-1, :-2]), list(cum[:, 1:-1]), list(cum[:-1, 2:])
+    tmp = np.empty(r - 2)
+    step = np.empty(r - 2, "f")
+    for i in range(c - 1):
+        np.minimum(above[i], level[i], out=tmp)
+        np.minimum(tmp, below[i], out=step)
+        np.add(level[i + 1], step, out=level[i + 1])
+    # backtrack
+    rows = np.empty(c, dtype="int")
+    j = np.argmin(cum[-1, 1:-1])
+    rows[-1] = j
+    for i in range(c - 2, -1, -1):
+        j += np.argmin(cum[i, j : j + 3]) - 1
+        rows[i] = j
+    return rows
+
+
+class FeatureMap:
+    """
+    Seamcarve energy map `gaussian_filter(sobel(im), 0.5)` of a grayscale
+    image, computed lazily in tiles.
+
+    Only the tiles under the patches sliced out by `_calc_seam` are computed,
+    in `dtype`, and kept for later patches, so the parts of a page outside
+    every line ROI are never filtered. Each tile is filtered with a halo
+    covering both filter kernels and the image borders are reflected as
+    before, so a tiled map equals the whole-image map in the same dtype.
+
+    Supports `shape` and contiguous 2d slicing; `np.asarray` computes the
+    whole map.
+    """
+
+    # the sobel kernel reaches 1 pixel and the gaussian 2 pixels further
+    HALO = 3
+
+    def __init__(self, im: np.ndarray, tile_size: int = 256, dtype=np.float32):
+        self.im = im
+        self.tile_size = tile_size
+        self.dtype = np.dtype(dtype)
+        self._tiles: Dict[tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.im.shape
+
+    def _tile(self, ty: int, tx: int) -> np.ndarray:
+        with self._lock:
+            tile = self._tiles.get((ty, tx))
+        if tile is not None:
+            return tile
+        h, w = self.im.shape
+        r0, c0 = ty * self.tile_size, tx * self.tile_size
+        r1, c1 = min(r0 + self.tile_size, h), min(c0 + self.tile_size, w)
+        hr0, hc0 = max(r0 - self.HALO, 0), max(c0 - self.HALO, 0)
+        hr1, hc1 = min(r1 + self.HALO, h), min(c1 + self.HALO, w)
+        src = self.im[hr0:hr1, hc0:hc1]
+        src = img_as_float32(src) if self.dtype == np.float32 else img_as_float64(src)
+        feats = gaussian_filter(sobel(src), 0.5)
+        tile = np.ascontiguousarray(feats[r0 - hr0 : r1 - hr0, c0 - hc0 : c1 - hc0])
+        with self._lock:
+            return self._tiles.setdefault((ty, tx), tile)
+
+    def __getitem__(self, key) -> np.ndarray:
+        (r0, r1, r_step), (c0, c1, c_step) = (
+            k.indices(n) for k, n in zip(key, self.shape)
+        )
+        if r_step != 1 or c_step != 1:
+            raise IndexError("FeatureMap only supports contiguous slices")
+        r1, c1 = max(r0, r1), max(c0, c1)
+        out = np.empty((r1 - r0, c1 - c0), dtype=self.dtype)
+        ts = self.tile_size
+        for ty in range(r0 // ts, -(-r1 // ts)):
+            for tx in range(c0 // ts, -(-c1 // ts)):
+                tile = self._tile(ty, tx)
+                ir0, ir1 = max(r0, ty * ts), min(r1, (ty + 1) * ts)
+                ic0, ic1 = max(c0, tx * ts), min(c1, (tx + 1) * ts)
+                out[ir0 - r0 : ir1 - r0, ic0 - c0 : ic1 - c0] = tile[
+                    ir0 - ty * ts : ir1 - ty * ts, ic0 - tx * ts : ic1 - tx * ts
+                ]
+        return out
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        feats = self[:, :]
+        return feats if dtype is None else feats.astype(dtype)
 
 
 def _calc_seam(baseline, polygon, angle, im_feats, bias=150):
@@ -631,7 +997,7 @@ def _calc_seam(baseline, polygon, angle, im_feats, bias=150):
         center=extrema[0],
         scale=scale,
         cval=MASK_VAL,
-        use_skimage_warp=True,
+        use_cv2_warp=True,
     )
     # ensure to cut off padding after rotation
     x_offsets = np.sort(np.around(tform.inverse(extrema)[:, 0]).astype("int"))
@@ -640,28 +1006,8 @@ def _calc_seam(baseline, polygon, angle, im_feats, bias=150):
     rotated_patch = np.pad(
         rotated_patch, ((1, 1), (0, 0)), mode="constant", constant_values=np.inf
     )
-    r, c = rotated_patch.shape
-    # fold into shape (c, r-2 3)
-    A = np.lib.stride_tricks.as_strided(
-        rotated_patch,
-        (c, r - 2, 3),
-        (rotated_patch.strides[1], rotated_patch.strides[0], rotated_patch.strides[0]),
-    )
-    B = rotated_patch[1:-1, 1:].swapaxes(0, 1)
-    backtrack = np.zeros_like(B, dtype="int")
-    T = np.empty((B.shape[1]), "f")
-    R = np.arange(-1, len(T) - 1)
-    for i in np.arange(c - 1):
-        A[i].min(1, T)
-        backtrack[i] = A[i].argmin(1) + R
-        B[i] += T
-    # backtrack
-    seam = []
-    j = np.argmin(rotated_patch[1:-1, -1])
-    for i in range(c - 2, -2, -1):
-        seam.append((i + x_offsets[0] + 1, j))
-        j = backtrack[i, j]
-    seam = np.array(seam)[::-1]
+    rows = _carve_seam(rotated_patch)
+    seam = np.stack((np.arange(len(rows)) + x_offsets[0], rows), axis=1)
     seam_mean = seam[:, 1].mean()
     seam_std = seam[:, 1].std()
     seam[:, 1] = np.clip(seam[:, 1], seam_mean - seam_std, seam_mean + seam_std)
@@ -754,43 +1100,65 @@ def _extract_patch(
     return polygon
 
 
-def _calc_roi(line, bounds, baselines, suppl_obj, p_dir):
+class PolylineIndex:
+    """
+    Polylines bounding the polygonization of baselines, with an STRtree built
+    once so that each baseline only tests the polylines near it.
+
+    `select` returns a view on a subset of the polylines sharing the tree,
+    e.g. all lines of a page but the one being polygonized.
+    """
+
+    def __init__(self, polylines: Sequence[Sequence[tuple[int, int]]]):
+        self.polylines = polylines
+        self.geoms = np.empty(len(polylines), dtype=object)
+        self.geoms[:] = [geom.LineString(x) for x in polylines]
+        self.tree = STRtree(self.geoms)
+        self.members = np.ones(len(self.geoms), dtype=bool)
+
+    def select(self, indices) -> "PolylineIndex":
+        view = copy.copy(self)
+        view.members = np.zeros(len(self.geoms), dtype=bool)
+        view.members[indices] = True
+        return view
+
+    def split(self, upper: geom.Polygon, bottom: geom.Polygon):
+        """
+        Returns the member polylines intersecting `upper`, and the remaining
+        ones intersecting `bottom`, each in input order.
+        """
+        side_a = np.zeros(len(self.geoms), dtype=bool)
+        side_a[self.tree.query(upper, predicate="intersects")] = True
+        side_a &= self.members
+        side_b = np.zeros(len(self.geoms), dtype=bool)
+        side_b[self.tree.query(bottom, predicate="intersects")] = True
+        side_b &= self.members & ~side_a
+        return list(self.geoms[side_a]), list(self.geoms[side_b])
+
+
+def _calc_roi(line, bounds, baselines, suppl_obj, p_dir, obstacles=None):
     # interpolate baseline
     ls = geom.LineString(line)
-    ip_line = [line[0]]
-    dist = 10
-    while dist < ls.length:
-        ip_line.append(np.array(ls.interpolate(dist).coords[0]))
-        dist += 10
-    ip_line.append(line[-1])
-    ip_line = np.array(ip_line)
-    upper_bounds_intersects = []
-    bottom_bounds_intersects = []
-    for point in ip_line:
-        upper_bounds_intersects.append(
-            _ray_intersect_boundaries(
-                point, (p_dir * (-1, 1))[::-1], bounds + 1
-            ).astype("int")
-        )
-        bottom_bounds_intersects.append(
-            _ray_intersect_boundaries(
-                point, (p_dir * (1, -1))[::-1], bounds + 1
-            ).astype("int")
-        )
+    ip_points = shapely.line_interpolate_point(ls, np.arange(10, ls.length, 10))
+    ip_line = np.concatenate(
+        [[line[0]], shapely.get_coordinates(ip_points), [line[-1]]]
+    )
+    upper_bounds_intersects = _ray_intersect_boundaries(
+        ip_line, (p_dir * (-1, 1))[::-1], bounds + 1
+    ).astype("int")
+    bottom_bounds_intersects = _ray_intersect_boundaries(
+        ip_line, (p_dir * (1, -1))[::-1], bounds + 1
+    ).astype("int")
     # build polygon between baseline and bbox intersects
-    upper_polygon = geom.Polygon(ip_line.tolist() + upper_bounds_intersects)
-    bottom_polygon = geom.Polygon(ip_line.tolist() + bottom_bounds_intersects)
+    upper_polygon = geom.Polygon(np.concatenate([ip_line, upper_bounds_intersects]))
+    bottom_polygon = geom.Polygon(np.concatenate([ip_line, bottom_bounds_intersects]))
 
     # select baselines at least partially in each polygon
-    side_a = [geom.LineString(upper_bounds_intersects)]
-    side_b = [geom.LineString(bottom_bounds_intersects)]
-
-    for adj_line in baselines + suppl_obj:
-        adj_line = geom.LineString(adj_line)
-        if upper_polygon.intersects(adj_line):
-            side_a.append(adj_line)
-        elif bottom_polygon.intersects(adj_line):
-            side_b.append(adj_line)
+    if obstacles is None:
+        obstacles = PolylineIndex(baselines + suppl_obj)
+    adj_a, adj_b = obstacles.split(upper_polygon, bottom_polygon)
+    side_a = [geom.LineString(upper_bounds_intersects)] + adj_a
+    side_b = [geom.LineString(bottom_bounds_intersects)] + adj_b
     side_a = unary_union(side_a).buffer(1).boundary
     side_b = unary_union(side_b).buffer(1).boundary
 
@@ -815,26 +1183,77 @@ def _calc_roi(line, bounds, baselines, suppl_obj, p_dir):
                 f"No intersection with boundaries. Shapely intersection object: {intersects.wkt}"
             )
 
-    env_up = []
-    env_bottom = []
     # find orthogonal (to linear regression) intersects with adjacent objects to complete roi
-    for point, upper_bounds_intersect, bottom_bounds_intersect in zip(
-        ip_line, upper_bounds_intersects, bottom_bounds_intersects
-    ):
-        upper_limit = _find_closest_point(
-            point, geom.LineString([point, upper_bounds_intersect]).intersection(side_a)
-        )
-        bottom_limit = _find_closest_point(
-            point,
-            geom.LineString([point, bottom_bounds_intersect]).intersection(side_b),
-        )
-        env_up.append(upper_limit.coords[0])
-        env_bottom.append(bottom_limit.coords[0])
-    env_up = np.array(env_up, dtype="uint")
-    env_bottom = np.array(env_bottom, dtype="uint")
+    up_intersects = shapely.intersection(
+        shapely.linestrings(np.stack([ip_line, upper_bounds_intersects], axis=1)),
+        side_a,
+    )
+    bottom_intersects = shapely.intersection(
+        shapely.linestrings(np.stack([ip_line, bottom_bounds_intersects], axis=1)),
+        side_b,
+    )
+    # single point intersections are the limits, the rest is resolved in
+    # order so that the first failing point raises as before
+    env_up = _single_point_coords(up_intersects)
+    env_bottom = _single_point_coords(bottom_intersects)
+    pending = np.isnan(env_up[:, 0]) | np.isnan(env_bottom[:, 0])
+    for idx in np.flatnonzero(pending):
+        env_up[idx] = _find_closest_point(ip_line[idx], up_intersects[idx]).coords[0]
+        env_bottom[idx] = _find_closest_point(
+            ip_line[idx], bottom_intersects[idx]
+        ).coords[0]
+    env_up = env_up.astype("uint")
+    env_bottom = env_bottom.astype("uint")
     return env_up, env_bottom
 
 
+def _single_point_coords(geoms: np.ndarray) -> np.ndarray:
+    """
+    Coordinates of the non-empty points in an array of geometries, NaN for
+    all other geometries.
+    """
+    coords = np.full((len(geoms), 2), np.nan)
+    points = (shapely.get_type_id(geoms) == 0) & ~shapely.is_empty(geoms)
+    coords[points] = shapely.get_coordinates(geoms[points])
+    return coords
+
+
+def _polygonize_line(line, bounds, obstacles, im_feats, topline):
+    """
+    Computes the bounding polygon of a single baseline bounded by
+    `obstacles`.
+    """
+    end_points = (line[0], line[-1])
+    line = geom.LineString(line)
+    offset = (
+        default_specs.SEGMENTATION_HYPER_PARAMS["line_width"]
+        if topline is not None
+        else 0
+    )
+    offset_line = line.parallel_offset(offset, side="left" if topline else "right")
+    line = np.array(line.coords, dtype=float)
+    offset_line = np.array(offset_line.coords, dtype=float)
+
+    # calculate magnitude-weighted average direction vector
+    lengths = np.linalg.norm(np.diff(line.T), axis=0)
+    p_dir = np.mean(np.diff(line.T) * lengths / lengths.sum(), axis=1)
+    p_dir = p_dir.T / np.sqrt(np.sum(p_dir**2, axis=-1))
+    env_up, env_bottom = _calc_roi(line, bounds, None, None, p_dir, obstacles=obstacles)
+
+    return _extract_patch(
+        env_up,
+        env_bottom,
+        line.astype("int"),
+        offset_line.astype("int"),
+        end_points,
+        p_dir,
+        topline,
+        offset,
+        im_feats,
+        bounds,
+    )
+
+
 def calculate_polygonal_environment(
     im: Image.Image = None,
     baselines: Sequence[Sequence[tuple[int, int]]] = None,
@@ -843,6 +1262,8 @@ def calculate_polygonal_environment(
     scale: tuple[int, int] = None,
     topline: bool = False,
     raise_on_error: bool = False,
+    obstacles: Union[PolylineIndex, Sequence[PolylineIndex], None] = None,
+    processes: Optional[int] = None,
 ):
     """
     Given a list of baselines and an input image, calculates a polygonal
@@ -856,8 +1277,10 @@ def calculate_polygonal_environment(
                    be used to prevent polygonization into non-text areas such
                    as illustrations or to compute the polygonization of a
                    subset of the lines in an image.
-        im_feats: An optional precomputed seamcarve energy map. Overrides data
-                  in `im`. The default map is `gaussian_filter(sobel(im), 2)`.
+        im_feats: An optional precomputed seamcarve energy map, an array or
+                  a `FeatureMap` shared between calls on the same image.
+                  Overrides data in `im`. The default is a float32
+                  `FeatureMap` of `im`.
         scale: A 2-tuple (h, w) containing optional scale factors of the input.
                Values of 0 are used for aspect-preserving scaling. `None` skips
                input scaling.
@@ -868,6 +1291,14 @@ def calculate_polygonal_environment(
                  offset downwards. If set to None, no offset will be applied.
         raise_on_error: Raises error instead of logging them when they are
                         not-blocking
+        obstacles: A prebuilt index of the polylines bounding every baseline,
+                   or one view per baseline selected from a single index,
+                   used instead of the other baselines and `suppl_obj`. Lets
+                   callers build the index of a page once. Not affected by
+                   `scale`.
+        processes: Polygonizes the baselines in a pool of this many worker
+                   processes reading the feature map from shared memory.
+                   Disabled for values below 2.
     Returns:
         list of lists of coordinates. If no polygonization could be compute for
         a baseline `None` is returned instead.
@@ -891,58 +1322,49 @@ def calculate_polygonal_environment(
 
     if im_feats is None:
         bounds = np.array(im.size, dtype=float) - 1
-        im = np.array(im.convert("L"))
-        # compute image gradient
-        im_feats = gaussian_filter(sobel(im), 0.5)
+        # image gradient, computed for the line ROIs only
+        im_feats = FeatureMap(np.array(im.convert("L")))
     else:
         bounds = np.array(im_feats.shape[::-1], dtype=float) - 1
 
-    polygons = []
     if suppl_obj is None:
         suppl_obj = []
 
-    for idx, line in enumerate(baselines):
-        try:
-            end_points = (line[0], line[-1])
-            line = geom.LineString(line)
-            offset = (
-                default_specs.SEGMENTATION_HYPER_PARAMS["line_width"]
-                if topline is not None
-                else 0
-            )
-            offset_line = line.parallel_offset(
-                offset, side="left" if topline else "right"
-            )
-            line = np.array(line.coords, dtype=float)
-            offset_line = np.array(offset_line.coords, dtype=float)
-
-            # calculate magnitude-weighted average direction vector
-            lengths = np.linalg.norm(np.diff(line.T), axis=0)
-            p_dir = np.mean(np.diff(line.T) * lengths / lengths.sum(), axis=1)
-            p_dir = p_dir.T / np.sqrt(np.sum(p_dir**2, axis=-1))
-            env_up, env_bottom = _calc_roi(
-                line, bounds, baselines[:idx] + baselines[idx + 1 :], suppl_obj, p_dir
-            )
-
-            polygons.append(
-                _extract_patch(
-                    env_up,
-                    env_bottom,
-                    line.astype("int"),
-                    offset_line.astype("int"),
-                    end_points,
-                    p_dir,
-                    topline,
-                    offset,
-                    im_feats,
-                    bounds,
+    if processes and processes > 1 and len(baselines) > 1:
+        polygons = _polygonize_parallel(
+            baselines,
+            suppl_obj,
+            im_feats,
+            bounds,
+            topline,
+            raise_on_error,
+            obstacles,
+            processes,
+        )
+    else:
+        polygons = []
+        page_obstacles = None
+        for idx, line in enumerate(baselines):
+            try:
+                if isinstance(obstacles, PolylineIndex):
+                    line_obstacles = obstacles
+                elif obstacles is not None:
+                    line_obstacles = obstacles[idx]
+                else:
+                    if page_obstacles is None:
+                        page_obstacles = PolylineIndex(baselines + suppl_obj)
+                    # every baseline is bounded by all others and suppl_obj
+                    line_obstacles = page_obstacles.select(
+                        np.arange(len(page_obstacles.geoms)) != idx
+                    )
+                polygons.append(
+                    _polygonize_line(line, bounds, line_obstacles, im_feats, topline)
                 )
-            )
-        except Exception as e:
-            if raise_on_error:
-                raise
-            logger.warning(f"Polygonizer failed on line {idx}: {e}")
-            polygons.append(None)
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                logger.warning(f"Polygonizer failed on line {idx}: {e}")
+                polygons.append(None)
 
     if scale is not None:
         polygons = [
@@ -952,6 +1374,125 @@ def calculate_polygonal_environment(
     return polygons
 
 
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+
+
+def _polygonize_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    The process pool of parallel polygonization, kept between calls as
+    starting workers costs more than polygonizing a page.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn so workers do not inherit CUDA state or locks of threads
+            _pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_size = processes
+        return _pool
+
+
+def _polygonize_chunk(
+    shm_name, shape, dtype, polylines, bounds, topline, raise_on_error, tasks
+):
+    """
+    Polygonizes (index, baseline, obstacle mask) tasks in a worker process.
+    Failures are returned as messages unless `raise_on_error` is set.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    im_feats = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    obstacles = None
+    results = []
+    try:
+        for idx, line, members in tasks:
+            try:
+                if obstacles is None:
+                    obstacles = PolylineIndex(polylines)
+                polygon = _polygonize_line(
+                    line, bounds, obstacles.select(members), im_feats, topline
+                )
+                results.append((idx, polygon, None))
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                results.append((idx, None, str(e)))
+    finally:
+        del im_feats
+        shm.close()
+    return results
+
+
+def _polygonize_parallel(
+    baselines,
+    suppl_obj,
+    im_feats,
+    bounds,
+    topline,
+    raise_on_error,
+    obstacles,
+    processes,
+):
+    """
+    Polygonizes baselines in worker processes sharing the feature map, see
+    `calculate_polygonal_environment`. Polygons are returned in input order
+    and the first failing line raises if `raise_on_error` is set.
+    """
+    if isinstance(obstacles, PolylineIndex):
+        polylines = obstacles.polylines
+        members = [obstacles.members] * len(baselines)
+    elif obstacles is not None:
+        polylines = obstacles[0].polylines
+        members = [x.members for x in obstacles]
+    else:
+        polylines = list(baselines) + list(suppl_obj)
+        members = [np.arange(len(polylines)) != idx for idx in range(len(baselines))]
+
+    # a lazy feature map is computed in full here, workers only read it
+    feats = np.asarray(im_feats)
+    shm = shared_memory.SharedMemory(create=True, size=max(feats.nbytes, 1))
+    try:
+        np.ndarray(feats.shape, dtype=feats.dtype, buffer=shm.buf)[:] = feats
+        tasks = list(zip(range(len(baselines)), baselines, members))
+        # a few chunks per worker balance uneven line lengths
+        chunk_size = -(-len(tasks) // (processes * 4))
+        pool = _polygonize_pool(processes)
+        futures = [
+            pool.submit(
+                _polygonize_chunk,
+                shm.name,
+                feats.shape,
+                feats.dtype,
+                polylines,
+                bounds,
+                topline,
+                raise_on_error,
+                tasks[i : i + chunk_size],
+            )
+            for i in range(0, len(tasks), chunk_size)
+        ]
+        polygons = []
+        try:
+            for future in futures:
+                for idx, polygon, error in future.result():
+                    if error is not None:
+                        logger.warning(f"Polygonizer failed on line {idx}: {error}")
+                    polygons.append(polygon)
+        finally:
+            for future in futures:
+                future.cancel()
+            # workers may still read the feature map
+            wait(futures)
+    finally:
+        shm.close()
+        shm.unlink()
+    return polygons
+
+
 def polygonal_reading_order(
     lines: Sequence[Dict],
     text_direction: Literal["lr", "rl"] = "lr",
@@ -977,25 +1518,28 @@ def polygonal_reading_order(
     bounds = []
     if regions is None:
         regions = []
+    regions = list(regions)
     region_lines = [[] for _ in range(len(regions))]
     indizes = {}
-    for line_idx, line in enumerate(lines):
-        s_line = geom.LineString(line[1])
-        in_region = False
-        for idx, reg in enumerate(regions):
-            if is_in_region(s_line, reg):
-                region_lines[idx].append(
+    s_lines = [geom.LineString(line[1]) for line in lines]
+    # each line belongs to the first region containing its mid point
+    line_idxs, reg_idxs = np.nonzero(lines_in_regions(s_lines, regions))
+    first = np.unique(line_idxs, return_index=True)[1]
+    line_region = np.full(len(lines), -1)
+    line_region[line_idxs[first]] = reg_idxs[first]
+    for line_idx, (line, s_line) in enumerate(zip(lines, s_lines)):
+        idx = line_region[line_idx]
+        if idx >= 0:
+            region_lines[idx].append(
+                (
+                    line_idx,
                     (
-                        line_idx,
-                        (
-                            slice(s_line.bounds[1], s_line.bounds[3]),
-                            slice(s_line.bounds[0], s_line.bounds[2]),
-                        ),
-                    )
+                        slice(s_line.bounds[1], s_line.bounds[3]),
+                        slice(s_line.bounds[0], s_line.bounds[2]),
+                    ),
                 )
-                in_region = True
-                break
-        if not in_region:
+            )
+        else:
             bounds.append(
                 (
                     slice(s_line.bounds[1], s_line.bounds[3]),
@@ -1072,45 +1616,30 @@ def neural_reading_order(
     ]
     # construct all possible pairs
     h, w = im_size
-    features = []
-    for i in lines:
-        for j in lines:
-            if i == j and len(lines) != 1:
-                continue
-            num_classes = len(class_mapping) + 1
-            cl_i = torch.zeros(num_classes, dtype=torch.float)
-            cl_j = torch.zeros(num_classes, dtype=torch.float)
-            cl_i[class_mapping.get(i[0], 0)] = 1
-            cl_j[class_mapping.get(j[0], 0)] = 1
-            line_coords_i = np.array(i[1]) / (w, h)
-            line_center_i = np.mean(line_coords_i, axis=0)
-            line_coords_j = np.array(j[1]) / (w, h)
-            line_center_j = np.mean(line_coords_j, axis=0)
-            features.append(
-                torch.cat(
-                    (
-                        cl_i,
-                        torch.tensor(line_center_i, dtype=torch.float),  # lin
-                        torch.tensor(line_coords_i[0, :], dtype=torch.float),
-                        torch.tensor(line_coords_i[-1, :], dtype=torch.float),
-                        cl_j,
-                        torch.tensor(line_center_j, dtype=torch.float),  # lin
-                        torch.tensor(line_coords_j[0, :], dtype=torch.float),
-                        torch.tensor(line_coords_j[-1, :], dtype=torch.float),
-                    )
-                )
-            )
-    features = torch.stack(features)
+    num_classes = len(class_mapping) + 1
+    cls = torch.zeros((len(lines), num_classes), dtype=torch.float)
+    cls[
+        torch.arange(len(lines)),
+        torch.tensor([class_mapping.get(line[0], 0) for line in lines]),
+    ] = 1
+    coords = [np.array(line[1]) / (w, h) for line in lines]
+    # center, first and last point of each line
+    points = torch.tensor(
+        np.array(
+            [np.concatenate((np.mean(c, axis=0), c[0, :], c[-1, :])) for c in coords]
+        ),
+        dtype=torch.float,
+    )
+    line_feats = torch.cat((cls, points), dim=1)
+    # all ordered pairs of distinct lines, row by row
+    pair_i, pair_j = torch.nonzero(
+        ~torch.eye(len(lines), dtype=torch.bool), as_tuple=True
+    )
+    features = torch.cat((line_feats[pair_i], line_feats[pair_j]), dim=1)
     output = F.sigmoid(model(features))
 
     order = torch.zeros((len(lines), len(lines)))
-    idx = 0
-    for i in range(len(lines)):
-        for j in range(len(lines)):
-            if i == j and len(lines) != 1:
-                continue
-            order[i, j] = output[idx]
-            idx += 1
+    order[pair_i, pair_j] = output.reshape(-1)
     # decode order relation matrix
     path = _greedy_order_decoder(order)
     return path
@@ -1131,21 +1660,21 @@ def _greedy_order_decoder(P):
     A = P + torch.finfo(torch.float).eps
     N = P.shape[0]
     A = (A + (1 - A).T) / 2
-    for i in range(A.shape[0]):
-        A[i, i] = torch.finfo(torch.float).eps
+    A.fill_diagonal_(torch.finfo(torch.float).eps)
     best_path = []
+    selected = torch.zeros(N, dtype=torch.bool)
     # use log(p(R\mid s',s)) to shift multiplication to sum
     lP = torch.log(A)
-    for i in range(N):
-        lP[i, i] = 0
+    lP.fill_diagonal_(0)
     for t in range(N):
-        for i in range(N):
-            idx = torch.argmax(lP.sum(axis=1))
-            if idx not in best_path:
-                best_path.append(idx)
-                lP[idx, :] = lP[:, idx]
-                lP[:, idx] = 0
-                break
+        idx = int(torch.argmax(lP.sum(axis=1)))
+        # lP is left unchanged, so an already selected maximum ends decoding
+        if selected[idx]:
+            break
+        selected[idx] = True
+        best_path.append(idx)
+        lP[idx, :] = lP[:, idx]
+        lP[:, idx] = 0
     return torch.tensor(best_path)
 
 
@@ -1420,8 +1949,286 @@ def apply_polygonal_mask(
     return out
 
 
+def _extract_baseline_line(
+    im: Image.Image, line: "BaselineLine", legacy: bool, order: int
+) -> Optional[Image.Image]:
+    """
+    Cuts out and dewarps a single baseline line of `extract_polygons`.
+    Returns None for lines too short to extract.
+    """
+    if line.boundary is None:
+        raise KrakenInputException("No boundary given for line")
+    if len(line.baseline) < 2 or geom.LineString(line.baseline).length < 10:
+        return None
+    pl = np.array(line.boundary)
+    baseline = np.array(line.baseline)
+    c_min, c_max = int(pl[:, 0].min()), int(pl[:, 0].max())
+    r_min, r_max = int(pl[:, 1].min()), int(pl[:, 1].max())
+
+    # clamp to image bounds
+    # c_min = max(c_min, 0)
+    # r_min = max(r_min, 0)
+    # c_max = min(c_max, im.width - 1)
+    # r_max = min(r_max, im.height - 1)
+
+    imshape = np.array([im.height, im.width])
+
+    if (pl < 0).any() or (pl.max(axis=0)[::-1] >= imshape).any():
+        raise KrakenInputException("Line polygon outside of image bounds")
+    if (baseline < 0).any() or (baseline.max(axis=0)[::-1] >= imshape).any():
+        raise KrakenInputException("Baseline outside of image bounds")
+
+    if legacy:
+        im = np.asarray(im)
+        # Old, slow, and deprecated path
+        # fast path for straight baselines requiring only rotation
+        if len(baseline) == 2:
+            baseline = baseline.astype(float)
+            # calculate direction vector
+            lengths = np.linalg.norm(np.diff(baseline.T), axis=0)
+            p_dir = np.mean(np.diff(baseline.T) * lengths / lengths.sum(), axis=1)
+            p_dir = p_dir.T / np.sqrt(np.sum(p_dir**2, axis=-1))
+            angle = np.arctan2(p_dir[1], p_dir[0])
+            patch = im[r_min : r_max + 1, c_min : c_max + 1].copy()
+            offset_polygon = pl - (c_min, r_min)
+            offset_polygon2 = offset_polygon.flatten().tolist()
+            img = Image.new("L", patch.shape[:2][::-1], 0)
+            ImageDraw.Draw(img).polygon(offset_polygon2, outline=1, fill=1)
+            mask = np.asarray(img, dtype=bool)
+            patch[np.invert(mask)] = 0
+            extrema = offset_polygon[(0, -1), :]
+            # scale line image to max 600 pixel width
+            tform, rotated_patch = _rotate(
+                patch, angle, center=extrema[0], scale=1.0, cval=(255, 255, 255)
+            )
+            i = Image.fromarray(rotated_patch.astype("uint8"))
+        # normal slow path with piecewise affine transformation
+        else:
+            if len(pl) > 50:
+                pl = approximate_polygon(pl, 2)
+            full_polygon = subdivide_polygon(pl, preserve_ends=True)
+            pl = geom.MultiPoint(full_polygon)
+
+            bl = zip(baseline[:-1:], baseline[1::])
+            bl = [geom.LineString(x) for x in bl]
+            cum_lens = np.cumsum([0] + [line.length for line in bl])
+            # distance of intercept from start point and number of line segment
+            control_pts = []
+            for point in pl.geoms:
+                npoint = np.array(point.coords)[0]
+                line_idx, dist, intercept = min(
+                    (
+                        (
+                            idx,
+                            line.project(point),
+                            np.array(line.interpolate(line.project(point)).coords),
+                        )
+                        for idx, line in enumerate(bl)
+                    ),
+                    key=lambda x: np.linalg.norm(npoint - x[2]),
+                )
+                # absolute distance from start of line
+                line_dist = cum_lens[line_idx] + dist
+                intercept = np.array(intercept)
+                # side of line the point is at
+                side = np.linalg.det(
+                    np.array(
+                        [
+                            [
+                                baseline[line_idx + 1][0] - baseline[line_idx][0],
+                                npoint[0] - baseline[line_idx][0],
+                            ],
+                            [
+                                baseline[line_idx + 1][1] - baseline[line_idx][1],
+                                npoint[1] - baseline[line_idx][1],
+                            ],
+                        ]
+                    )
+                )
+                side = np.sign(side)
+                # signed perpendicular distance from the rectified distance
+                per_dist = side * np.linalg.norm(npoint - intercept)
+                control_pts.append((line_dist, per_dist))
+            # calculate baseline destination points
+            bl_dst_pts = baseline[0] + np.dstack((cum_lens, np.zeros_like(cum_lens)))[0]
+            # calculate bounding polygon destination points
+            pol_dst_pts = np.array(
+                [
+                    baseline[0] + (line_dist, per_dist)
+                    for line_dist, per_dist in control_pts
+                ]
+            )
+            # extract bounding box patch
+            c_dst_min, c_dst_max = (
+                int(pol_dst_pts[:, 0].min()),
+                int(pol_dst_pts[:, 0].max()),
+            )
+            r_dst_min, r_dst_max = (
+                int(pol_dst_pts[:, 1].min()),
+                int(pol_dst_pts[:, 1].max()),
+            )
+            output_shape = np.around(
+                (r_dst_max - r_dst_min + 1, c_dst_max - c_dst_min + 1)
+            )
+            patch = im[r_min : r_max + 1, c_min : c_max + 1].copy()
+            # offset src points by patch shape
+            offset_polygon = full_polygon - (c_min, r_min)
+            offset_baseline = baseline - (c_min, r_min)
+            # offset dst point by dst polygon shape
+            offset_bl_dst_pts = bl_dst_pts - (c_dst_min, r_dst_min)
+            offset_pol_dst_pts = pol_dst_pts - (c_dst_min, r_dst_min)
+            # mask out points outside bounding polygon
+            offset_polygon2 = offset_polygon.flatten().tolist()
+            img = Image.new("L", patch.shape[:2][::-1], 0)
+            ImageDraw.Draw(img).polygon(offset_polygon2, outline=1, fill=1)
+            mask = np.asarray(img, dtype=bool)
+            patch[np.invert(mask)] = 0
+            # estimate piecewise transform
+            src_points = np.concatenate((offset_baseline, offset_polygon))
+            dst_points = np.concatenate((offset_bl_dst_pts, offset_pol_dst_pts))
+            tform = FastPiecewiseAffineTransform()
+            tform.estimate(src_points, dst_points)
+            o = warp(
+                patch,
+                tform.inverse,
+                output_shape=output_shape,
+                preserve_range=True,
+                order=order,
+            )
+            i = Image.fromarray(o.astype("uint8"))
+
+    else:  # if not legacy
+        # new, fast, and efficient path
+        # fast path for straight baselines requiring only rotation
+        if len(baseline) == 2:
+            baseline = baseline.astype(float)
+            # calculate direction vector
+            lengths = np.linalg.norm(np.diff(baseline.T), axis=0)
+            p_dir = np.mean(np.diff(baseline.T) * lengths / lengths.sum(), axis=1)
+            p_dir = p_dir.T / np.sqrt(np.sum(p_dir**2, axis=-1))
+            angle = np.arctan2(p_dir[1], p_dir[0])
+            # crop out bounding box
+            patch = im.crop((c_min, r_min, c_max + 1, r_max + 1))
+            offset_polygon = pl - (c_min, r_min)
+            patch = apply_polygonal_mask(patch, offset_polygon, cval=(255, 255, 255))
+            extrema = offset_polygon[(0, -1), :]
+            tform, i = _rotate(
+                patch,
+                angle,
+                center=extrema[0],
+                scale=1.0,
+                cval=(255, 255, 255),
+                order=order,
+            )
+        # normal slow path with piecewise affine transformation
+        else:
+            if len(pl) > 50:
+                pl = approximate_polygon(pl, 2)
+            full_polygon = subdivide_polygon(pl, preserve_ends=True)
+
+            # baseline segment vectors
+            diff_bl = np.diff(baseline, axis=0)
+            diff_bl_norms = np.linalg.norm(diff_bl, axis=1)
+            diff_bl_normed = diff_bl / diff_bl_norms[:, None]
+
+            l_poly = len(full_polygon)
+            cum_lens = np.cumsum([0] + np.linalg.norm(diff_bl, axis=1).tolist())
+
+            # calculate baseline destination points :
+            bl_dst_pts = baseline[0] + np.dstack((cum_lens, np.zeros_like(cum_lens)))[0]
+
+            # calculate bounding polygon destination points :
+            # diff[k, p] = baseline[k] - polygon[p]
+            poly_bl_diff = full_polygon[None, :] - baseline[:-1, None]
+            # local x coordinates of polygon points on baseline segments
+            # x[k, p] = (baseline[k] - polygon[p]) . (baseline[k+1] - baseline[k]) / |baseline[k+1] - baseline[k]|
+            poly_bl_x = np.einsum("kpm,km->kp", poly_bl_diff, diff_bl_normed)
+            # distance to baseline segments
+            poly_bl_segdist = np.maximum(-poly_bl_x, poly_bl_x - diff_bl_norms[:, None])
+            # closest baseline segment index
+            poly_closest_bl = np.argmin((poly_bl_segdist), axis=0)
+            poly_bl_x = poly_bl_x[poly_closest_bl, np.arange(l_poly)]
+            poly_bl_diff = poly_bl_diff[poly_closest_bl, np.arange(l_poly)]
+            # signed distance between polygon points and baseline segments (to get y coordinates)
+            poly_bl_y = np.cross(diff_bl_normed[poly_closest_bl], poly_bl_diff)
+            # final destination points
+            pol_dst_pts = (
+                np.array([cum_lens[poly_closest_bl] + poly_bl_x, poly_bl_y]).T
+                + baseline[:1]
+            )
+
+            # extract bounding box patch
+            c_dst_min, c_dst_max = (
+                int(pol_dst_pts[:, 0].min()),
+                int(pol_dst_pts[:, 0].max()),
+            )
+            r_dst_min, r_dst_max = (
+                int(pol_dst_pts[:, 1].min()),
+                int(pol_dst_pts[:, 1].max()),
+            )
+            output_shape = np.around(
+                (r_dst_max - r_dst_min + 1, c_dst_max - c_dst_min + 1)
+            )
+            patch = im.crop((c_min, r_min, c_max + 1, r_max + 1))
+            # offset src points by patch shape
+            offset_polygon = full_polygon - (c_min, r_min)
+            offset_baseline = baseline - (c_min, r_min)
+            # offset dst point by dst polygon shape
+            offset_bl_dst_pts = bl_dst_pts - (c_dst_min, r_dst_min)
+            # mask out points outside bounding polygon
+            patch = apply_polygonal_mask(patch, offset_polygon, cval=(255, 255, 255))
+
+            # estimate piecewise transform by beveling angles
+            source_envelope, target_envelope = _bevelled_warping_envelope(
+                offset_baseline, offset_bl_dst_pts[0], output_shape
+            )
+            # mesh for PIL, as (box, quad) tuples : box is (NW, SE) and quad is (NW, SW, SE, NE)
+            deform_mesh = [
+                (
+                    (*target_envelope[i], *target_envelope[i + 3]),
+                    (
+                        *source_envelope[i],
+                        *source_envelope[i + 1],
+                        *source_envelope[i + 3],
+                        *source_envelope[i + 2],
+                    ),
+                )
+                for i in range(0, len(source_envelope) - 3, 2)
+            ]
+            # warp
+            resample = {
+                0: Resampling.NEAREST,
+                1: Resampling.BILINEAR,
+                2: Resampling.BICUBIC,
+                3: Resampling.BICUBIC,
+            }.get(order, Resampling.NEAREST)
+            i = patch.transform(
+                (output_shape[1], output_shape[0]),
+                Image.MESH,
+                data=deform_mesh,
+                resample=resample,
+            )
+    # bbox = i.getbbox()
+    # if bbox is None:
+    #     out = i
+    # else:
+    #     cropped = i.crop(bbox)
+    #     w, h = cropped.size
+
+    #     # create padded canvas
+    #     out = Image.new(cropped.mode, (w + 2 * pad, h + 2 * pad), 255)
+    #     out.paste(cropped, (pad, pad))
+
+    # yield out, line
+    return i.crop(i.getbbox())
+
+
 def extract_polygons(
-    im: Image.Image, bounds: "Segmentation", legacy: bool = False, pad=0
+    im: Image.Image,
+    bounds: "Segmentation",
+    legacy: bool = False,
+    pad=0,
+    workers: Optional[int] = None,
 ) -> Generator[
     tuple[
         Image.Image,
@@ -1439,6 +2246,9 @@ def extract_polygons(
         bounds: A Segmentation class containing a bounding box or baseline
                 segmentation.
         legacy: Use the old, slow, and deprecated path
+        pad: Dilation radius of the line boundaries
+        workers: Number of threads extracting baseline lines in parallel.
+                 Lines are still yielded in order of `bounds.lines`.
 
     Yields:
         The extracted subimage, and the corresponding bounding box or baseline
@@ -1453,290 +2263,34 @@ def extract_polygons(
 
         bounds = dilate_boundary(bounds, im, padding=pad)
 
-        for line in bounds.lines:
-            if line.boundary is None:
-                raise KrakenInputException("No boundary given for line")
-            if len(line.baseline) < 2 or geom.LineString(line.baseline).length < 10:
-                continue
-            pl = np.array(line.boundary)
-            baseline = np.array(line.baseline)
-            c_min, c_max = int(pl[:, 0].min()), int(pl[:, 0].max())
-            r_min, r_max = int(pl[:, 1].min()), int(pl[:, 1].max())
-
-            # clamp to image bounds
-            # c_min = max(c_min, 0)
-            # r_min = max(r_min, 0)
-            # c_max = min(c_max, im.width - 1)
-            # r_max = min(r_max, im.height - 1)
-
-            imshape = np.array([im.height, im.width])
-
-            if (pl < 0).any() or (pl.max(axis=0)[::-1] >= imshape).any():
-                raise KrakenInputException("Line polygon outside of image bounds")
-            if (baseline < 0).any() or (baseline.max(axis=0)[::-1] >= imshape).any():
-                raise KrakenInputException("Baseline outside of image bounds")
-
-            if legacy:
-                im = np.asarray(im)
-                # Old, slow, and deprecated path
-                # fast path for straight baselines requiring only rotation
-                if len(baseline) == 2:
-                    baseline = baseline.astype(float)
-                    # calculate direction vector
-                    lengths = np.linalg.norm(np.diff(baseline.T), axis=0)
-                    p_dir = np.mean(
-                        np.diff(baseline.T) * lengths / lengths.sum(), axis=1
-                    )
-                    p_dir = p_dir.T / np.sqrt(np.sum(p_dir**2, axis=-1))
-                    angle = np.arctan2(p_dir[1], p_dir[0])
-                    patch = im[r_min : r_max + 1, c_min : c_max + 1].copy()
-                    offset_polygon = pl - (c_min, r_min)
-                    offset_polygon2 = offset_polygon.flatten().tolist()
-                    img = Image.new("L", patch.shape[:2][::-1], 0)
-                    ImageDraw.Draw(img).polygon(offset_polygon2, outline=1, fill=1)
-                    mask = np.asarray(img, dtype=bool)
-                    patch[np.invert(mask)] = 0
-                    extrema = offset_polygon[(0, -1), :]
-                    # scale line image to max 600 pixel width
-                    tform, rotated_patch = _rotate(
-                        patch, angle, center=extrema[0], scale=1.0, cval=(255, 255, 255)
-                    )
-                    i = Image.fromarray(rotated_patch.astype("uint8"))
-                # normal slow path with piecewise affine transformation
-                else:
-                    if len(pl) > 50:
-                        pl = approximate_polygon(pl, 2)
-                    full_polygon = subdivide_polygon(pl, preserve_ends=True)
-                    pl = geom.MultiPoint(full_polygon)
-
-                    bl = zip(baseline[:-1:], baseline[1::])
-                    bl = [geom.LineString(x) for x in bl]
-                    cum_lens = np.cumsum([0] + [line.length for line in bl])
-                    # distance of intercept from start point and number of line segment
-                    control_pts = []
-                    for point in pl.geoms:
-                        npoint = np.array(point.coords)[0]
-                        line_idx, dist, intercept = min(
-                            (
-                                (
-                                    idx,
-                                    line.project(point),
-                                    np.array(
-                                        line.interpolate(line.project(point)).coords
-                                    ),
-                                )
-                                for idx, line in enumerate(bl)
-                            ),
-                            key=lambda x: np.linalg.norm(npoint - x[2]),
-                        )
-                        # absolute distance from start of line
-                        line_dist = cum_lens[line_idx] + dist
-                        intercept = np.array(intercept)
-                        # side of line the point is at
-                        side = np.linalg.det(
-                            np.array(
-                                [
-                                    [
-                                        baseline[line_idx + 1][0]
-                                        - baseline[line_idx][0],
-                                        npoint[0] - baseline[line_idx][0],
-                                    ],
-                                    [
-                                        baseline[line_idx + 1][1]
-                                        - baseline[line_idx][1],
-                                        npoint[1] - baseline[line_idx][1],
-                                    ],
-                                ]
-                            )
-                        )
-                        side = np.sign(side)
-                        # signed perpendicular distance from the rectified distance
-                        per_dist = side * np.linalg.norm(npoint - intercept)
-                        control_pts.append((line_dist, per_dist))
-                    # calculate baseline destination points
-                    bl_dst_pts = (
-                        baseline[0] + np.dstack((cum_lens, np.zeros_like(cum_lens)))[0]
-                    )
-                    # calculate bounding polygon destination points
-                    pol_dst_pts = np.array(
-                        [
-                            baseline[0] + (line_dist, per_dist)
-                            for line_dist, per_dist in control_pts
-                        ]
-                    )
-                    # extract bounding box patch
-                    c_dst_min, c_dst_max = (
-                        int(pol_dst_pts[:, 0].min()),
-                        int(pol_dst_pts[:, 0].max()),
-                    )
-                    r_dst_min, r_dst_max = (
-                        int(pol_dst_pts[:, 1].min()),
-                        int(pol_dst_pts[:, 1].max()),
-                    )
-                    output_shape = np.around(
-                        (r_dst_max - r_dst_min + 1, c_dst_max - c_dst_min + 1)
-                    )
-                    patch = im[r_min : r_max + 1, c_min : c_max + 1].copy()
-                    # offset src points by patch shape
-                    offset_polygon = full_polygon - (c_min, r_min)
-                    offset_baseline = baseline - (c_min, r_min)
-                    # offset dst point by dst polygon shape
-                    offset_bl_dst_pts = bl_dst_pts - (c_dst_min, r_dst_min)
-                    offset_pol_dst_pts = pol_dst_pts - (c_dst_min, r_dst_min)
-                    # mask out points outside bounding polygon
-                    offset_polygon2 = offset_polygon.flatten().tolist()
-                    img = Image.new("L", patch.shape[:2][::-1], 0)
-                    ImageDraw.Draw(img).polygon(offset_polygon2, outline=1, fill=1)
-                    mask = np.asarray(img, dtype=bool)
-                    patch[np.invert(mask)] = 0
-                    # estimate piecewise transform
-                    src_points = np.concatenate((offset_baseline, offset_polygon))
-                    dst_points = np.concatenate((offset_bl_dst_pts, offset_pol_dst_pts))
-                    tform = FastPiecewiseAffineTransform()
-                    tform.estimate(src_points, dst_points)
-                    o = warp(
-                        patch,
-                        tform.inverse,
-                        output_shape=output_shape,
-                        preserve_range=True,
-                        order=order,
-                    )
-                    i = Image.fromarray(o.astype("uint8"))
-
-            else:  # if not legacy
-                # new, fast, and efficient path
-                # fast path for straight baselines requiring only rotation
-                if len(baseline) == 2:
-                    baseline = baseline.astype(float)
-                    # calculate direction vector
-                    lengths = np.linalg.norm(np.diff(baseline.T), axis=0)
-                    p_dir = np.mean(
-                        np.diff(baseline.T) * lengths / lengths.sum(), axis=1
-                    )
-                    p_dir = p_dir.T / np.sqrt(np.sum(p_dir**2, axis=-1))
-                    angle = np.arctan2(p_dir[1], p_dir[0])
-                    # crop out bounding box
-                    patch = im.crop((c_min, r_min, c_max + 1, r_max + 1))
-                    offset_polygon = pl - (c_min, r_min)
-                    patch = apply_polygonal_mask(
-                        patch, offset_polygon, cval=(255, 255, 255)
-                    )
-                    extrema = offset_polygon[(0, -1), :]
-                    tform, i = _rotate(
-                        patch,
-                        angle,
-                        center=extrema[0],
-                        scale=1.0,
-                        cval=(255, 255, 255),
-                        order=order,
-                    )
-                # normal slow path with piecewise affine transformation
-                else:
-                    if len(pl) > 50:
-                        pl = approximate_polygon(pl, 2)
-                    full_polygon = subdivide_polygon(pl, preserve_ends=True)
-
-                    # baseline segment vectors
-                    diff_bl = np.diff(baseline, axis=0)
-                    diff_bl_norms = np.linalg.norm(diff_bl, axis=1)
-                    diff_bl_normed = diff_bl / diff_bl_norms[:, None]
-
-                    l_poly = len(full_polygon)
-                    cum_lens = np.cumsum([0] + np.linalg.norm(diff_bl, axis=1).tolist())
-
-                    # calculate baseline destination points :
-                    bl_dst_pts = (
-                        baseline[0] + np.dstack((cum_lens, np.zeros_like(cum_lens)))[0]
-                    )
-
-                    # calculate bounding polygon destination points :
-                    # diff[k, p] = baseline[k] - polygon[p]
-                    poly_bl_diff = full_polygon[None, :] - baseline[:-1, None]
-                    # local x coordinates of polygon points on baseline segments
-                    # x[k, p] = (baseline[k] - polygon[p]) . (baseline[k+1] - baseline[k]) / |baseline[k+1] - baseline[k]|
-                    poly_bl_x = np.einsum("kpm,km->kp", poly_bl_diff, diff_bl_normed)
-                    # distance to baseline segments
-                    poly_bl_segdist = np.maximum(
-                        -poly_bl_x, poly_bl_x - diff_bl_norms[:, None]
-                    )
-                    # closest baseline segment index
-                    poly_closest_bl = np.argmin((poly_bl_segdist), axis=0)
-                    poly_bl_x = poly_bl_x[poly_closest_bl, np.arange(l_poly)]
-                    poly_bl_diff = poly_bl_diff[poly_closest_bl, np.arange(l_poly)]
-                    # signed distance between polygon points and baseline segments (to get y coordinates)
-                    poly_bl_y = np.cross(diff_bl_normed[poly_closest_bl], poly_bl_diff)
-                    # final destination points
-                    pol_dst_pts = (
-                        np.array([cum_lens[poly_closest_bl] + poly_bl_x, poly_bl_y]).T
-                        + baseline[:1]
-                    )
-
-                    # extract bounding box patch
-                    c_dst_min, c_dst_max = (
-                        int(pol_dst_pts[:, 0].min()),
-                        int(pol_dst_pts[:, 0].max()),
-                    )
-                    r_dst_min, r_dst_max = (
-                        int(pol_dst_pts[:, 1].min()),
-                        int(pol_dst_pts[:, 1].max()),
-                    )
-                    output_shape = np.around(
-                        (r_dst_max - r_dst_min + 1, c_dst_max - c_dst_min + 1)
-                    )
-                    patch = im.crop((c_min, r_min, c_max + 1, r_max + 1))
-                    # offset src points by patch shape
-                    offset_polygon = full_polygon - (c_min, r_min)
-                    offset_baseline = baseline - (c_min, r_min)
-                    # offset dst point by dst polygon shape
-                    offset_bl_dst_pts = bl_dst_pts - (c_dst_min, r_dst_min)
-                    # mask out points outside bounding polygon
-                    patch = apply_polygonal_mask(
-                        patch, offset_polygon, cval=(255, 255, 255)
-                    )
+        if not workers or workers < 2:
+            for line in bounds.lines:
+                i = _extract_baseline_line(im, line, legacy, order)
+                if i is not None:
+                    yield i, line
+            return
 
-                    # estimate piecewise transform by beveling angles
-                    source_envelope, target_envelope = _bevelled_warping_envelope(
-                        offset_baseline, offset_bl_dst_pts[0], output_shape
-                    )
-                    # mesh for PIL, as (box, quad) tuples : box is (NW, SE) and quad is (NW, SW, SE, NE)
-                    deform_mesh = [
-                        (
-                            (*target_envelope[i], *target_envelope[i + 3]),
-                            (
-                                *source_envelope[i],
-                                *source_envelope[i + 1],
-                                *source_envelope[i + 3],
-                                *source_envelope[i + 2],
-                            ),
-                        )
-                        for i in range(0, len(source_envelope) - 3, 2)
-                    ]
-                    # warp
-                    resample = {
-                        0: Resampling.NEAREST,
-                        1: Resampling.BILINEAR,
-                        2: Resampling.BICUBIC,
-                        3: Resampling.BICUBIC,
-                    }.get(order, Resampling.NEAREST)
-                    i = patch.transform(
-                        (output_shape[1], output_shape[0]),
-                        Image.MESH,
-                        data=deform_mesh,
-                        resample=resample,
-                    )
-            # bbox = i.getbbox()
-            # if bbox is None:
-            #     out = i
-            # else:
-            #     cropped = i.crop(bbox)
-            #     w, h = cropped.size
-
-            #     # create padded canvas
-            #     out = Image.new(cropped.mode, (w + 2 * pad, h + 2 * pad), 255)
-            #     out.paste(cropped, (pad, pad))
-
-            # yield out, line
-            yield i.crop(i.getbbox()), line
+        # lines are independent, and the Pillow operations doing most of the
+        # work release the GIL
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # bounded window of lines in flight, consumed in input order
+            pending = deque()
+            for line in bounds.lines:
+                future = executor.submit(
+                    _extract_baseline_line, im, line, legacy, order
+                )
+                pending.append((line, future))
+                if len(pending) < 2 * workers:
+                    continue
+                line, future = pending.popleft()
+                i = future.result()
+                if i is not None:
+                    yield i, line
+            while pending:
+                line, future = pending.popleft()
+                i = future.result()
+                if i is not None:
+                    yield i, line
     else:
         if bounds.text_direction.startswith("vertical"):
             angle = 90
@@ -1760,50 +2314,52 @@ def extract_polygons(
 
 def expand_boundary(seg: "Segmentation", im: Image.Image, padding=5) -> "Segmentation":
     if seg.type == "baselines":
-        for j, line in enumerate(seg.lines):
+        for line in seg.lines:
             if line.boundary is None:
                 raise KrakenInputException("No boundary given for line")
             if len(line.baseline) < 2 or geom.LineString(line.baseline).length < 10:
                 continue
-            corrected_line = possibly_reverse_boundary(line)
-            seg.lines[j].boundary = corrected_line.boundary
-            seg.lines[j].baseline = corrected_line.baseline
             pl = np.array(line.boundary)
+            if _needs_reversal(pl):
+                line.boundary = list(reversed(line.boundary))
+                line.baseline = list(reversed(line.baseline))
+                pl = pl[::-1]
             c_min, c_max = int(pl[:, 0].min()), int(pl[:, 0].max())
-            r_min, r_max = int(pl[:, 1].min()), int(pl[:, 1].max())
-            c_min_index, c_max_index = (
-                np.where(pl[:, 0] == c_min)[0],
-                np.where(pl[:, 0] == c_max)[0],
-            )
-            r_min_index, r_max_index = (
-                np.where(pl[:, 1] == r_min)[0],
-                np.where(pl[:, 1] == r_max)[0],
-            )
+            at_min, at_max = pl[:, 0] == c_min, pl[:, 0] == c_max
+            c_max_index = np.flatnonzero(at_max)
             if len(c_max_index) >= 2:
                 if np.abs(c_max_index[-1] - c_max_index[0]) != len(c_max_index) - 1:
                     continue
-            for i, item in enumerate(pl):
-                if i <= c_max_index[0]:
-                    seg.lines[j].boundary[i][1] += padding
-                    seg.lines[j].boundary[i][1] = min(
-                        seg.lines[j].boundary[i][1], im.height - 1
-                    )
-                else:
-                    seg.lines[j].boundary[i][1] -= padding
-                    seg.lines[j].boundary[i][1] = max(seg.lines[j].boundary[i][1], 0)
-
-                if i in c_max_index:
-                    seg.lines[j].boundary[i][0] += 30
-                    seg.lines[j].boundary[i][0] = min(
-                        seg.lines[j].boundary[i][0], im.width - 1
-                    )
-                elif i in c_min_index:
-                    seg.lines[j].boundary[i][0] -= 30
-                    seg.lines[j].boundary[i][0] = max(seg.lines[j].boundary[i][0], 0)
+            # shift the points up to the first right end down, the rest up
+            expanded = pl.copy()
+            upper = np.arange(len(pl)) <= c_max_index[0]
+            expanded[:, 1] = np.where(
+                upper,
+                np.minimum(pl[:, 1] + padding, im.height - 1),
+                np.maximum(pl[:, 1] - padding, 0),
+            )
+            # and move the left and right ends outwards
+            expanded[:, 0] = np.where(
+                at_max,
+                np.minimum(pl[:, 0] + 30, im.width - 1),
+                np.where(at_min, np.maximum(pl[:, 0] - 30, 0), pl[:, 0]),
+            )
+            line.boundary = expanded.tolist()
 
     return seg
 
 
+def _needs_reversal(pl: np.ndarray) -> bool:
+    """
+    Tests if a boundary array runs the wrong way around its line, i.e. if
+    the points before its leftmost one are higher up than those after.
+    """
+    c_min_index = np.flatnonzero(pl[:, 0] == int(pl[:, 0].min()))
+    mean_before_minc = np.mean(pl[0 : c_min_index[0], 1])
+    mean_after_minc = np.mean(pl[c_min_index[0] : -1, 1])
+    return mean_before_minc < mean_after_minc
+
+
 def possibly_reverse_boundary(line):
     """
     Reverses the boundary and baseline of a BaselineLine object.
@@ -1813,44 +2369,57 @@ def possibly_reverse_boundary(line):
     Returns:
         The reversed Line object.
     """
-    pl=np.array(line.boundary)
-    c_min, c_max = int(pl[:, 0].min()), int(pl[:, 0].max())
-    c_min_index, c_max_index = (
-        np.where(pl[:, 0] == c_min)[0],
-        np.where(pl[:, 0] == c_max)[0],
-    )
-    mean_before_minc = np.mean(pl[0 : c_min_index[0], 1])
-    mean_after_minc = np.mean(pl[c_min_index[0] : -1, 1])
-    if mean_before_minc < mean_after_minc:
+    if _needs_reversal(np.array(line.boundary)):
         line.boundary = list(reversed(line.boundary))
         line.baseline = list(reversed(line.baseline))
     return line
 
 
 def dilate_boundary(seg: "Segmentation", im: Image.Image, padding=5) -> "Segmentation":
+    """
+    Returns a copy of a baseline segmentation with every line boundary
+    dilated by `padding` pixels. `seg` itself is left unchanged so that a
+    stored segmentation can be re-extracted with different paddings.
+
+    Each line is rasterized and dilated in a window around its bounding box
+    clipped to the page, so time and memory follow the line area rather than
+    the page area. The result is the same as on a full page mask.
+    """
     if seg.type == "baselines":
-        for j, line in enumerate(seg.lines):
+        # circular structuring element
+        radius = padding
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_ELLIPSE,
+            (2*radius + 1, 2*radius + 1)
+        )
+        # keeps one empty pixel around the dilated line inside the page
+        margin = radius + 1
+
+        lines = []
+        for line in seg.lines:
             if line.boundary is None:
                 raise KrakenInputException("No boundary given for line")
             if len(line.baseline) < 2 or geom.LineString(line.baseline).length < 10:
+                lines.append(line)
                 continue
 
-            mask = np.zeros((im.height, im.width), dtype=np.uint8)
+            boundary = np.array(line.boundary).astype(np.int32)
+            x0, y0 = np.maximum(boundary.min(axis=0) - margin, 0)
+            x1 = min(boundary[:, 0].max() + margin + 1, im.width)
+            y1 = min(boundary[:, 1].max() + margin + 1, im.height)
 
-            cv2.fillPoly(mask, [np.array(line.boundary).astype(np.int32)], 1)
-
-            # circular structuring element
-            radius = padding
-            kernel = cv2.getStructuringElement(
-                cv2.MORPH_ELLIPSE,
-                (2*radius + 1, 2*radius + 1)
-            )
+            mask = np.zeros((max(y1 - y0, 1), max(x1 - x0, 1)), dtype=np.uint8)
+            cv2.fillPoly(mask, [boundary - (x0, y0)], 1)
 
             dilated_mask = cv2.dilate(mask, kernel)
 
-            # optional: extract boundary back to polygon
+            # extract boundary back to polygon in page coordinates
             contours, _ = cv2.findContours(
-                dilated_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+                dilated_mask,
+                cv2.RETR_EXTERNAL,
+                cv2.CHAIN_APPROX_SIMPLE,
+                offset=(int(x0), int(y0)),
             )
-            seg.lines[j].boundary = np.squeeze(contours[0])
+            lines.append(dataclasses.replace(line, boundary=np.squeeze(contours[0])))
+        seg = dataclasses.replace(seg, lines=lines)
     return seg
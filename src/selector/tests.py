@@ -1,3 +1,478 @@
-from django.test import TestCase
+import copy
+import os
+import socket
+import subprocess
+import sys
+import warnings
+from datetime import timedelta
+from unittest import skipIf
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import jobs
+from .models import Document, Notebook, SegmentationJob
+
+try:
+    import numpy as np
+    from kraken.containers import BaselineLine, Segmentation
+    from PIL import Image
+    from skimage.measure import label, regionprops
+
+    from . import segmentation
+except ImportError:  # the ml extra is not installed
+    segmentation = None
+
+
+# The previous implementations of the geometry helpers, kept as references
+# so that faster rewrites cannot silently change their output.
+
+
+def _reading_order_reference(lines, text_direction="lr"):
+    order = np.zeros((len(lines), len(lines)), "B")
+
+    def _x_overlaps(u, v):
+        return u[1].start < v[1].stop and u[1].stop > v[1].start
+
+    def _above(u, v):
+        return u[0].start < v[0].start
+
+    def _left_of(u, v):
+        return u[1].stop < v[1].start
+
+    def _separates(w, u, v):
+        if w == u or w == v:
+            return 0
+        if w[0].stop < min(u[0].start, v[0].start):
+            return 0
+        if w[0].start > max(u[0].stop, v[0].stop):
+            return 0
+        if w[1].start < u[1].stop and w[1].stop > v[1].start:
+            return 1
+        return 0
+
+    if text_direction == "rl":
+
+        def horizontal_order(u, v):
+            return not _left_of(u, v)
+    else:
+        horizontal_order = _left_of
+
+    for i, u in enumerate(lines):
+        for j, v in enumerate(lines):
+            if _x_overlaps(u, v):
+                if _above(u, v):
+                    order[i, j] = 1
+            else:
+                if [w for w in lines if _separates(w, u, v)] == []:
+                    if horizontal_order(u, v):
+                        order[i, j] = 1
+    return order
+
+
+def _topsort_reference(order):
+    n = len(order)
+    visited = np.zeros(n)
+    L = []
+
+    def _visit(k):
+        if visited[k]:
+            return
+        visited[k] = 1
+        (a,) = np.nonzero(np.ravel(order[:, k]))
+        for line in a:
+            _visit(line)
+        L.append(k)
+
+    for k in range(n):
+        _visit(k)
+    return L
+
+
+def _carve_seam_reference(rotated_patch):
+    r, c = rotated_patch.shape
+    # fold into shape (c, r-2 3)
+    A = np.lib.stride_tricks.as_strided(
+        rotated_patch,
+        (c, r - 2, 3),
+        (rotated_patch.strides[1], rotated_patch.strides[0], rotated_patch.strides[0]),
+    )
+    B = rotated_patch[1:-1, 1:].swapaxes(0, 1)
+    backtrack = np.zeros_like(B, dtype="int")
+    T = np.empty((B.shape[1]), "f")
+    R = np.arange(-1, len(T) - 1)
+    for i in np.arange(c - 1):
+        A[i].min(1, T)
+        backtrack[i] = A[i].argmin(1) + R
+        B[i] += T
+    seam = []
+    j = np.argmin(rotated_patch[1:-1, -1])
+    for i in range(c - 2, -2, -1):
+        seam.append(j)
+        j = backtrack[i, j]
+    return np.array(seam)[::-1]
+
+
+def _possibly_reverse_boundary_reference(line):
+    pl = np.array(line.boundary)
+    c_min = int(pl[:, 0].min())
+    c_min_index = np.where(pl[:, 0] == c_min)[0]
+    mean_before_minc = np.mean(pl[0 : c_min_index[0], 1])
+    mean_after_minc = np.mean(pl[c_min_index[0] : -1, 1])
+    if mean_before_minc < mean_after_minc:
+        line.boundary = list(reversed(line.boundary))
+        line.baseline = list(reversed(line.baseline))
+    return line
+
+
+def _expand_boundary_reference(seg, im, padding=5):
+    for j, line in enumerate(seg.lines):
+        if len(line.baseline) < 2 or segmentation.geom.LineString(line.baseline).length < 10:
+            continue
+        corrected_line = _possibly_reverse_boundary_reference(line)
+        seg.lines[j].boundary = corrected_line.boundary
+        seg.lines[j].baseline = corrected_line.baseline
+        pl = np.array(line.boundary)
+        c_min, c_max = int(pl[:, 0].min()), int(pl[:, 0].max())
+        c_min_index, c_max_index = (
+            np.where(pl[:, 0] == c_min)[0],
+            np.where(pl[:, 0] == c_max)[0],
+        )
+        if len(c_max_index) >= 2:
+            if np.abs(c_max_index[-1] - c_max_index[0]) != len(c_max_index) - 1:
+                continue
+        for i, item in enumerate(pl):
+            if i <= c_max_index[0]:
+                seg.lines[j].boundary[i][1] += padding
+                seg.lines[j].boundary[i][1] = min(
+                    seg.lines[j].boundary[i][1], im.height - 1
+                )
+            else:
+                seg.lines[j].boundary[i][1] -= padding
+                seg.lines[j].boundary[i][1] = max(seg.lines[j].boundary[i][1], 0)
+            if i in c_max_index:
+                seg.lines[j].boundary[i][0] += 30
+                seg.lines[j].boundary[i][0] = min(
+                    seg.lines[j].boundary[i][0], im.width - 1
+                )
+            elif i in c_min_index:
+                seg.lines[j].boundary[i][0] -= 30
+                seg.lines[j].boundary[i][0] = max(seg.lines[j].boundary[i][0], 0)
+    return seg
+
+
+def _dilate_boundary_reference(seg, im, padding=5):
+    cv2 = segmentation.cv2
+    for j, line in enumerate(seg.lines):
+        if len(line.baseline) < 2 or segmentation.geom.LineString(line.baseline).length < 10:
+            continue
+        mask = np.zeros((im.height, im.width), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.array(line.boundary).astype(np.int32)], 1)
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_ELLIPSE, (2 * padding + 1, 2 * padding + 1)
+        )
+        dilated_mask = cv2.dilate(mask, kernel)
+        contours, _ = cv2.findContours(
+            dilated_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        seg.lines[j].boundary = np.squeeze(contours[0])
+    return seg
+
+
+def _segmentation(lines):
+    return Segmentation(
+        type="baselines",
+        imagename="page.png",
+        text_direction="horizontal-rl",
+        script_detection=False,
+        lines=[
+            BaselineLine(id=str(i), baseline=baseline, boundary=boundary)
+            for i, (baseline, boundary) in enumerate(lines)
+        ],
+    )
+
+
+@skipIf(segmentation is None, "needs the ml extra")
+class GeometryTestCase(SimpleTestCase):
+    """Compares the geometry helpers with their previous implementations."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_reading_order(self):
+        for _ in range(300):
+            boxes = []
+            for _ in range(self.rng.integers(1, 12)):
+                if boxes and self.rng.random() < 0.2:
+                    # duplicate boxes never separate each other
+                    boxes.append(boxes[self.rng.integers(len(boxes))])
+                    continue
+                r, c = self.rng.integers(0, 60, 2)
+                h, w = self.rng.integers(1, 25, 2)
+                boxes.append((slice(r, r + h), slice(c, c + w)))
+            for direction in ("lr", "rl"):
+                order = segmentation.reading_order(boxes, direction)
+                np.testing.assert_array_equal(
+                    order, _reading_order_reference(boxes, direction)
+                )
+                self.assertEqual(
+                    segmentation.topsort(order), _topsort_reference(order)
+                )
+
+    def test_topsort_with_cycles(self):
+        for _ in range(200):
+            n = self.rng.integers(1, 20)
+            order = (self.rng.random((n, n)) < 0.2).astype("B")
+            self.assertEqual(segmentation.topsort(order), _topsort_reference(order))
+
+    def test_topsort_long_chain(self):
+        order = np.eye(5000, k=1, dtype="B")
+        self.assertEqual(segmentation.topsort(order), list(range(5000)))
+
+    def test_carve_seam(self):
+        for _ in range(300):
+            height, width = self.rng.integers(1, 40), self.rng.integers(2, 80)
+            # quantized energies with masked areas, so that ties occur
+            energy = np.round(self.rng.random((height, width)) * 20) / 4
+            energy[: height // 5] = 99999
+            energy[:, : width // 10] = 99999
+            energy = np.pad(
+                energy, ((1, 1), (0, 0)), mode="constant", constant_values=np.inf
+            ).astype(self.rng.choice(["f", "d"]))
+            np.testing.assert_array_equal(
+                segmentation._carve_seam(energy.copy()),
+                _carve_seam_reference(energy.copy()),
+            )
+
+    def test_trace_boundaries(self):
+        for _ in range(50):
+            shape = self.rng.integers(5, 60, 2)
+            blobs = self.rng.random(shape) < self.rng.uniform(0.2, 0.6)
+            # the reference cannot trace blobs on the top or left border
+            labelled = label(np.pad(blobs, 2))
+            boundaries = segmentation.trace_boundaries(labelled)
+            for region in regionprops(labelled):
+                if region.area < 6:
+                    continue
+                np.testing.assert_array_equal(
+                    boundaries[region.label], segmentation.boundary_tracing(region)
+                )
+
+    def _random_lines(self, width, height, count):
+        lines = []
+        for _ in range(count):
+            if self.rng.random() < 0.5:
+                # line-like: upper side to the right, lower side back
+                x = np.sort(self.rng.integers(-10, width + 10, self.rng.integers(2, 8)))
+                x = np.repeat(x, self.rng.integers(1, 3, len(x)))
+                y = self.rng.integers(0, height)
+                upper = np.stack([x, y - self.rng.integers(0, 20, len(x))], 1)
+                lower = np.stack([x[::-1], y + self.rng.integers(0, 20, len(x))], 1)
+                boundary = np.concatenate([upper, lower])
+                if self.rng.random() < 0.3:
+                    boundary = boundary[::-1]
+            else:
+                # arbitrary polygons crossing the page edges
+                n = self.rng.integers(3, 12)
+                boundary = np.stack(
+                    [
+                        self.rng.integers(-20, width + 20, n),
+                        self.rng.integers(-20, height + 20, n),
+                    ],
+                    1,
+                )
+            x0, x1 = boundary[:, 0].min(), boundary[:, 0].max()
+            y = int(boundary[:, 1].mean())
+            baseline = [[int(x0), y], [int(x1), y]]
+            lines.append((baseline, boundary.tolist()))
+        return lines
+
+    def test_expand_boundary(self):
+        im = Image.new("L", (200, 150))
+        with warnings.catch_warnings():
+            # the direction test averages empty slices
+            warnings.simplefilter("ignore", RuntimeWarning)
+            for _ in range(30):
+                seg = _segmentation(self._random_lines(im.width, im.height, 100))
+                padding = int(self.rng.integers(0, 15))
+                ref = _expand_boundary_reference(copy.deepcopy(seg), im, padding)
+                seg = segmentation.expand_boundary(seg, im, padding)
+                for line, ref_line in zip(seg.lines, ref.lines):
+                    self.assertEqual(
+                        np.asarray(line.boundary).tolist(),
+                        np.asarray(ref_line.boundary).tolist(),
+                    )
+                    self.assertEqual(
+                        np.asarray(line.baseline).tolist(),
+                        np.asarray(ref_line.baseline).tolist(),
+                    )
+
+    def test_dilate_boundary(self):
+        im = Image.new("L", (200, 150))
+        for padding in (0, 3, 10):
+            seg = _segmentation(self._random_lines(im.width, im.height, 100))
+            ref = _dilate_boundary_reference(copy.deepcopy(seg), im, padding)
+            dilated = segmentation.dilate_boundary(seg, im, padding)
+            for line, ref_line in zip(dilated.lines, ref.lines):
+                np.testing.assert_array_equal(line.boundary, ref_line.boundary)
+
+
+def _dead_pid() -> int:
+    # the pid of a process that has exited
+    proc = subprocess.Popen([sys.executable, "-c", ""])
+    proc.wait()
+    return proc.pid
+
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        notebook = Notebook.objects.create(name="notebook")
+        self.doc = Document.objects.create(notebook=notebook, page=1)
+        self.other_doc = Document.objects.create(notebook=notebook, page=2)
+
+    def _job(self, status=SegmentationJob.Status.PENDING, **kwargs):
+        kwargs.setdefault("document", self.doc)
+        kwargs.setdefault("model_name", "blla")
+        return SegmentationJob.objects.create(status=status, **kwargs)
+
+    def _running(self, worker="elsewhere:1", age=0, **kwargs):
+        return self._job(
+            SegmentationJob.Status.RUNNING,
+            worker=worker,
+            started_at=timezone.now() - timedelta(seconds=age),
+            **kwargs,
+        )
+
+    def test_enqueue_reuses_pending_job(self):
+        (first,) = jobs.enqueue(self.doc, ["blla"], padding=10)
+        (second,) = jobs.enqueue(self.doc, ["blla"], padding=20)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(SegmentationJob.objects.count(), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.padding, 20)
+
+    def test_enqueue_next_to_running_job(self):
+        running = self._running()
+        (job,) = jobs.enqueue(self.doc, ["blla"])
+        self.assertNotEqual(job.pk, running.pk)
+        self.assertEqual(job.status, SegmentationJob.Status.PENDING)
+
+    def test_claim_next_groups_document_and_padding(self):
+        first = self._job(model_name="blla")
+        second = self._job(model_name="muharaf")
+        self._job(model_name="other", padding=20)
+        self._job(document=self.other_doc)
+        claimed = jobs.claim_next("worker:1")
+        self.assertEqual([job.pk for job in claimed], [first.pk, second.pk])
+        for job in claimed:
+            job.refresh_from_db()
+            self.assertEqual(job.status, SegmentationJob.Status.RUNNING)
+            self.assertEqual(job.worker, "worker:1")
+
+    def test_requeue(self):
+        job = self._job(SegmentationJob.Status.FAILED, error="boom")
+        self.assertTrue(jobs.requeue(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, SegmentationJob.Status.PENDING)
+        self.assertEqual(job.error, "")
+
+    def test_requeue_next_to_pending_job(self):
+        job = self._job(SegmentationJob.Status.FAILED, error="boom")
+        self._job()
+        # the unique constraint on pending jobs raises IntegrityError
+        self.assertFalse(jobs.requeue(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, SegmentationJob.Status.FAILED)
+        self.assertEqual(job.error, "boom")
+
+    def test_requeue_changed_job(self):
+        job = self._running()
+        SegmentationJob.objects.filter(pk=job.pk).update(
+            status=SegmentationJob.Status.DONE
+        )
+        self.assertFalse(jobs.requeue(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, SegmentationJob.Status.DONE)
+
+    def test_requeue_stale(self):
+        stale = self._running(age=7200)
+        superseded = self._running(age=7200, model_name="muharaf")
+        self._job(model_name="muharaf")
+        recent = self._running(age=60, document=self.other_doc)
+        self.assertEqual(jobs.requeue_stale(timeout=3600), 1)
+        for job in (stale, superseded, recent):
+            job.refresh_from_db()
+        self.assertEqual(stale.status, SegmentationJob.Status.PENDING)
+        self.assertEqual(stale.worker, "")
+        self.assertIsNone(stale.started_at)
+        # a newer pending job takes over, so the stale one fails
+        self.assertEqual(superseded.status, SegmentationJob.Status.FAILED)
+        self.assertIn("3600", superseded.error)
+        self.assertEqual(recent.status, SegmentationJob.Status.RUNNING)
+        self.assertEqual(jobs.requeue_stale(timeout=0), 0)
+
+    def test_requeue_orphaned(self):
+        host = socket.gethostname()
+        dead = self._running(worker=f"{host}:{_dead_pid()}")
+        # left behind by an earlier process with the caller's name
+        own = self._running(worker=f"{host}:{os.getpid()}", document=self.other_doc)
+        alive = self._running(worker=f"{host}:{os.getppid()}", model_name="muharaf")
+        remote = self._running(worker="elsewhere:1", model_name="other")
+        self.assertEqual(jobs.requeue_orphaned(jobs.worker_name()), 2)
+        for job in (dead, own, alive, remote):
+            job.refresh_from_db()
+        self.assertEqual(dead.status, SegmentationJob.Status.PENDING)
+        self.assertEqual(own.status, SegmentationJob.Status.PENDING)
+        self.assertEqual(alive.status, SegmentationJob.Status.RUNNING)
+        self.assertEqual(remote.status, SegmentationJob.Status.RUNNING)
+
+    def test_finish(self):
+        job = self._running(worker="worker:1")
+        jobs._finish(job, 1.5)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SegmentationJob.Status.DONE)
+        self.assertEqual(job.duration, 1.5)
+
+    def test_finish_ignores_reclaimed_job(self):
+        job = self._running(worker="worker:1", age=7200)
+        jobs.requeue_stale(timeout=3600)
+        (reclaimed,) = jobs.claim_next("worker:2")
+        jobs._finish(job, 1.5, "boom")
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.status, SegmentationJob.Status.RUNNING)
+        self.assertEqual(reclaimed.worker, "worker:2")
+        self.assertEqual(reclaimed.error, "")
+
+
+class PendingJobMigrationTestCase(TransactionTestCase):
+    before = [("selector", "0013_linesegment_geometry")]
+    after = [("selector", "0014_segmentationjob_unique_pending_segmentation_job")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_drops_duplicate_pending_jobs(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        notebook = apps.get_model("selector", "Notebook").objects.create(name="n")
+        doc = apps.get_model("selector", "Document").objects.create(
+            notebook=notebook, page=1
+        )
+        Job = apps.get_model("selector", "SegmentationJob")
+        kept = Job.objects.create(document=doc, model_name="blla", status=0)
+        Job.objects.create(document=doc, model_name="blla", status=0)
+        other = Job.objects.create(document=doc, model_name="muharaf", status=0)
+        done = Job.objects.create(document=doc, model_name="blla", status=2)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        self.assertEqual(
+            sorted(SegmentationJob.objects.values_list("pk", flat=True)),
+            sorted([kept.pk, other.pk, done.pk]),
+        )
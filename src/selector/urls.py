@@ -11,6 +11,7 @@ urlpatterns = [
     path('finalize/<int:id>', views.segment_finalize, name='segment-finalize'),
     path('finalize_admin/<int:id>', views.segment_finalize_admin, name='segment-finalize-admin'),
     path('image', views.pdf2image, name='image'),
+    path('line/<int:id>/crop', views.line_crop, name='line-crop'),
 ]
 
 if settings.DEBUG:
@@ -1,5 +1,5 @@
-from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpRequest
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import Http404, HttpResponse, HttpRequest
 from django.conf import settings
 from django.urls import reverse
 import os
@@ -48,25 +48,47 @@ def document_segmenter(request: HttpRequest, doc_id: int):
 def natural_key(s):
     return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s)]
 
-def segment_finalize_admin(request: HttpRequest, id: int):
-    from .models import Document, LineSegment
-    doc = Document.objects.get(pk=id)
+def validated_lines(doc):
+    """
+    Returns the accepted lines of a document by order, as (file name or None,
+    geometry or None) pairs from its validated folder and manifest.
+    """
+    from .crops import read_manifest
+
     doc_base_name,_=os.path.splitext(os.path.basename(doc.file.path))
     validated_folder = os.path.join(settings.MEDIA_ROOT, f"{doc_base_name}_validated")
-    if doc and os.path.isdir(validated_folder):
-        for fname in os.listdir(validated_folder):
-            fpath = os.path.join(validated_folder, fname)
-            if os.path.isfile(fpath):
-                try:
-                    order = int(os.path.splitext(fname)[0])
-                except ValueError:
-                    continue
-                # Create LineSegment referencing the file
-                LineSegment.objects.create(
-                    file=f"{doc_base_name}_validated/{fname}",
-                    order=order,
-                    document=doc
-                )
+    lines = {
+        int(order): (None, geometry)
+        for order, geometry in read_manifest(validated_folder).items()
+    }
+    for fname in list_segments(validated_folder):
+        try:
+            order = int(os.path.splitext(fname)[0])
+        except ValueError:
+            continue
+        lines[order] = (f"{doc_base_name}_validated/{fname}", lines.get(order, (None, None))[1])
+    return lines
+
+def create_line_segments(doc):
+    from .models import LineSegment
+
+    for order, (fname, geometry) in validated_lines(doc).items():
+        # Create LineSegment referencing the file and/or the line geometry
+        geometry = geometry or {}
+        LineSegment.objects.create(
+            file=fname or "",
+            order=order,
+            document=doc,
+            polygon=geometry.get("boundary"),
+            baseline=geometry.get("baseline"),
+            padding=geometry.get("padding"),
+        )
+
+def segment_finalize_admin(request: HttpRequest, id: int):
+    from .models import Document
+    doc = Document.objects.get(pk=id)
+    if doc:
+        create_line_segments(doc)
     # Redirect to admin changelist, including any filter/query params
     from django.urls import reverse
     base_url = reverse("admin:selector_document_changelist")
@@ -79,25 +101,9 @@ def segment_finalize_admin(request: HttpRequest, id: int):
 
 def segment_finalize(request: HttpRequest, id:int):
     if request.method == "POST":
-        from .models import Document, LineSegment
-        import os
+        from .models import Document
         doc=Document.objects.get(pk=id)
-        doc_base_name,_=os.path.splitext(os.path.basename(doc.file.path))
-        validated_folder = os.path.join(settings.MEDIA_ROOT, f"{doc_base_name}_validated")
-        if doc and os.path.isdir(validated_folder):
-            for fname in os.listdir(validated_folder):
-                fpath = os.path.join(validated_folder, fname)
-                if os.path.isfile(fpath):
-                    try:
-                        order = int(os.path.splitext(fname)[0])
-                    except ValueError:
-                        continue
-                    # Create LineSegment referencing the file
-                    LineSegment.objects.create(
-                        file=f"{doc_base_name}_validated/{fname}",
-                        order=order,
-                        document=doc
-                    )
+        create_line_segments(doc)
         # Redirect back to compare page
         model1 = request.GET.get("model1", "blla")
         model2 = request.GET.get("model2", "muharaf")
@@ -107,41 +113,70 @@ def segment_finalize(request: HttpRequest, id:int):
 
 def segment_recreate(request: HttpRequest, id: int):
     if request.method == "POST":
-        from . import admin as seg_admin
-        from .models import Document
+        from .admin import reextract_lines
+        from .jobs import enqueue
+        from .models import Document, SegmentationJob
         doc=Document.objects.get(pk=id)
-        doc_base_name,_=os.path.splitext(os.path.basename(doc.file.path))
         model1 = request.GET.get("model1", "blla")
         model2 = request.GET.get("model2", "muharaf")
         recreate = request.POST.get("recreate")
         padding = int(request.POST.get("padding", 10))
-        page_img_path = None
-        for ext in [".jpg", ".jpeg", ".png"]:
-            candidate = os.path.join(settings.MEDIA_ROOT, f"{doc_base_name}{ext}")
-            if os.path.exists(candidate):
-                page_img_path = candidate
-                break
-        if recreate == "model1":
-            model_func = getattr(seg_admin, f"extract_lines_{model1}", None)
-            if model_func and page_img_path:
-                model_file = f"{model1}_seg_best.mlmodel" if model1 == "muharaf" else "blla.mlmodel"
-                from kraken.lib import vgsl
-                model_obj = vgsl.TorchVGSLModel.load_model(model_file)
-                model_func(page_img_path, model1, model_obj, padding=padding)
-        elif recreate == "model2":
-            model_func = getattr(seg_admin, f"extract_lines_{model2}", None)
-            if model_func and page_img_path:
-                model_file = f"{model2}_seg_best.mlmodel" if model2 == "muharaf" else "blla.mlmodel"
-                from kraken.lib import vgsl
-                model_obj = vgsl.TorchVGSLModel.load_model(model_file)
-                model_func(page_img_path, model2, model_obj, padding=padding)
-        # After recreation, redirect to segment_compare with preserved idx1 and idx2
+        model_name = {"model1": model1, "model2": model2}.get(recreate)
+        if model_name in settings.SEGMENTATION_MODELS:
+            # A padding change only needs the cached lines, anything else
+            # runs in a worker process, see the segmentation_worker command
+            busy = SegmentationJob.objects.filter(
+                document=doc,
+                model_name=model_name,
+                status__in=[SegmentationJob.Status.PENDING, SegmentationJob.Status.RUNNING],
+            ).exists()
+            if busy or not reextract_lines(doc.file.path, model_name, padding=padding):
+                enqueue(doc, [model_name], padding=padding)
+        # After queueing, redirect to segment_compare with preserved idx1 and idx2
         idx1 = request.GET.get("idx1", "0")
         idx2 = request.GET.get("idx2", "0")
         return redirect(f"/compare/{doc.pk}?model1={model1}&model2={model2}&idx1={idx1}&idx2={idx2}")
 
+def list_segments(folder_path):
+    """Returns the line image file names in a folder in natural order."""
+    if not os.path.isdir(folder_path):
+        return []
+    return sorted([f for f in os.listdir(folder_path) if not f.startswith(".") and os.path.isfile(os.path.join(folder_path, f))], key=natural_key)
+
+def accept_line(doc, folder_path, fname, validated_path):
+    """
+    Adds a line image of a model folder to the validated lines. Its geometry
+    goes into the validated manifest; the image itself is only copied if
+    SEGMENT_COPY_VALIDATED is set or the line has no recorded geometry.
+    """
+    from .crops import read_manifest, write_manifest
+
+    order = max(validated_lines(doc), default=0) + 1
+    source = read_manifest(folder_path)
+    geometry = source.get("lines", {}).get(fname)
+    if geometry is not None:
+        manifest = read_manifest(validated_path)
+        manifest[str(order)] = dict(geometry, padding=source["padding"])
+        write_manifest(validated_path, manifest)
+    if settings.SEGMENT_COPY_VALIDATED or geometry is None:
+        src = os.path.join(folder_path, fname)
+        dst = os.path.join(validated_path, f"{order}{os.path.splitext(fname)[1]}")
+        shutil.copy2(src, dst)
+
+def line_crop(request: HttpRequest, id: int):
+    """Serves the image of a line segment, rendered from its page if needed."""
+    from .crops import content_type, get_crop
+    from .models import LineSegment
+
+    segment = get_object_or_404(LineSegment.objects.select_related("document"), pk=id)
+    if segment.file:
+        return redirect(segment.file.url)
+    if not segment.has_geometry:
+        raise Http404("Line segment has no image")
+    return HttpResponse(get_crop(segment), content_type=content_type(segment))
+
 def segment_compare(request: HttpRequest, id: int):
-    from .models import Document
+    from .models import Document, SegmentationJob
     doc = Document.objects.get(pk=id)
     doc_base_name,_=os.path.splitext(os.path.basename(doc.file.path))
     # Model folder names
@@ -159,8 +194,8 @@ def segment_compare(request: HttpRequest, id: int):
     folder2_path = os.path.join(media_root, folder2)
 
     # List segmentation files for each model (natural sort)
-    segs1 = sorted([f for f in os.listdir(folder1_path) if os.path.isfile(os.path.join(folder1_path, f))], key=natural_key)
-    segs2 = sorted([f for f in os.listdir(folder2_path) if os.path.isfile(os.path.join(folder2_path, f))], key=natural_key)
+    segs1 = list_segments(folder1_path)
+    segs2 = list_segments(folder2_path)
 
     # Clamp indices
     idx1 = max(0, min(idx1, len(segs1) - 1)) if segs1 else 0
@@ -174,17 +209,13 @@ def segment_compare(request: HttpRequest, id: int):
     os.makedirs(validated_path, exist_ok=True)
 
     if accept1 and segs1:
-        src = os.path.join(folder1_path, segs1[idx1])
-        dst = os.path.join(validated_path, f"{len(os.listdir(validated_path)) + 1}{os.path.splitext(segs1[idx1])[1]}")
-        shutil.copy2(src, dst)
+        accept_line(doc, folder1_path, segs1[idx1], validated_path)
         next_idx1 = min(idx1 + 1, len(segs1) - 1)
         next_idx2 = min(idx2 + 1, len(segs2) - 1)
         return redirect(request.path + f"?model1={model1}&model2={model2}&idx1={next_idx1}&idx2={next_idx2}")
 
     if accept2 and segs2:
-        src = os.path.join(folder2_path, segs2[idx2])
-        dst = os.path.join(validated_path, f"{len(os.listdir(validated_path)) + 1}{os.path.splitext(segs2[idx2])[1]}")
-        shutil.copy2(src, dst)
+        accept_line(doc, folder2_path, segs2[idx2], validated_path)
         next_idx1 = min(idx1 + 1, len(segs1) - 1)
         next_idx2 = min(idx2 + 1, len(segs2) - 1)
         return redirect(request.path + f"?model1={model1}&model2={model2}&idx1={next_idx1}&idx2={next_idx2}")
@@ -197,6 +228,13 @@ def segment_compare(request: HttpRequest, id: int):
             page_img = settings.MEDIA_URL + os.path.basename(candidate)
             break
 
+    # Models with segmentation jobs still queued or running for this page
+    active_jobs = set(
+        doc.segmentation_jobs.filter(
+            status__in=[SegmentationJob.Status.PENDING, SegmentationJob.Status.RUNNING]
+        ).values_list("model_name", flat=True)
+    )
+
     context = {
         "model1": model1,
         "model2": model2,
@@ -208,7 +246,9 @@ def segment_compare(request: HttpRequest, id: int):
         "seg2_count": len(segs2),
         "page_img": page_img,
         "doc_name": doc_base_name,
-        "id": doc.pk
+        "id": doc.pk,
+        "model1_busy": model1 in active_jobs,
+        "model2_busy": model2 in active_jobs,
     }
     return render(request, "selector/segment_compare.html", context)
 